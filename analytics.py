@@ -0,0 +1,177 @@
+import os
+import json
+import datetime
+import logging
+
+import numpy as np
+import pandas as pd
+
+import bar_cache
+import db
+import schema
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+DB_HOST = os.getenv("DB_HOST")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+
+TABLE = "rolling_metrics"
+COLUMNS = [
+    "ticker", "bar_interval", "date", "close", "return_pct", "window_return_pct", "volatility_pct",
+    "ma_short", "ma_long", "drawdown_pct", "max_drawdown_pct", "updated_at",
+]
+
+# Window lengths in bars for each interval the bar cache holds
+WINDOWS = {
+    "1mo": {"return": 12, "volatility": 12, "ma_short": 3, "ma_long": 12, "periods_per_year": 12},
+    "1wk": {"return": 52, "volatility": 13, "ma_short": 10, "ma_long": 40, "periods_per_year": 52},
+    "1d": {"return": 252, "volatility": 21, "ma_short": 50, "ma_long": 200, "periods_per_year": 252},
+}
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Window State, Kept Next to the Bars
+# ──────────────────────────────────────────────────────────────
+# Per (ticker, interval): the last closed bar folded in, the closes the longest window
+# still needs, the running peak and the worst drawdown seen so far.
+def connect(path=bar_cache.CACHE_PATH):
+    conn = bar_cache.connect(path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rolling_state (
+            ticker TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            last_date TEXT NOT NULL,
+            closes TEXT NOT NULL,
+            peak REAL,
+            max_drawdown REAL,
+            PRIMARY KEY (ticker, interval)
+        ) WITHOUT ROWID;
+    """)
+    return conn
+
+
+def load_state(cache, interval):
+    return {
+        ticker: (last_date, json.loads(closes), peak, max_drawdown)
+        for ticker, last_date, closes, peak, max_drawdown in cache.execute(
+            "SELECT ticker, last_date, closes, peak, max_drawdown FROM rolling_state WHERE interval = ?",
+            (interval,)
+        )
+    }
+
+
+def save_state(cache, interval, state):
+    cache.executemany("""
+        INSERT OR REPLACE INTO rolling_state (ticker, interval, last_date, closes, peak, max_drawdown)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (ticker, interval, last_date, json.dumps(closes), peak, max_drawdown)
+        for ticker, (last_date, closes, peak, max_drawdown) in state.items()
+    ])
+    cache.commit()
+
+
+def _history_length(windows):
+    return max(windows["return"] + 1, windows["volatility"] + 1, windows["ma_long"])
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Extend the Windows with the New Bars Only
+# ──────────────────────────────────────────────────────────────
+def extend(history, closes, peak, max_drawdown, windows):
+    series = pd.Series(list(history) + list(closes), dtype="float64")
+    returns = series.pct_change()
+    metrics = pd.DataFrame({
+        "return_pct": returns * 100,
+        "window_return_pct": (series / series.shift(windows["return"]) - 1) * 100,
+        "volatility_pct": returns.rolling(windows["volatility"]).std() * np.sqrt(windows["periods_per_year"]) * 100,
+        "ma_short": series.rolling(windows["ma_short"]).mean(),
+        "ma_long": series.rolling(windows["ma_long"]).mean(),
+    }).iloc[len(history):]
+
+    closes = np.asarray(closes, dtype="float64")
+    peaks = np.fmax.accumulate(np.concatenate([[np.nan if peak is None else peak], closes]))[1:]
+    drawdowns = (closes / peaks - 1) * 100
+    worst = np.fmin.accumulate(np.concatenate([[np.nan if max_drawdown is None else max_drawdown], drawdowns]))[1:]
+    metrics["drawdown_pct"] = drawdowns
+    metrics["max_drawdown_pct"] = worst
+    return metrics.reset_index(drop=True), peaks, worst
+
+
+# Prices and their moving averages keep 4 decimals like the bars they come from; percentages 2
+PRICE_METRICS = {"ma_short", "ma_long"}
+
+
+def _value(x, places=2):
+    return None if np.isnan(x) else round(float(x), places)
+
+
+def build_rows(cache, symbols, interval, state):
+    windows = WINDOWS[interval]
+    keep = _history_length(windows)
+    today = datetime.date.today()
+    updated_at = datetime.datetime.now()
+
+    rows = []
+    new_state = {}
+    for symbol in symbols:
+        last_date, history, peak, max_drawdown = state.get(symbol, ("", [], None, None))
+        bars = cache.execute("""
+            SELECT date, close FROM bars
+            WHERE ticker = ? AND interval = ? AND date > ? AND close > 0
+            ORDER BY date
+        """, (symbol, interval, last_date)).fetchall()
+        if not bars:
+            continue
+
+        dates = [datetime.date.fromisoformat(d) for d, _ in bars]
+        closes = [c for _, c in bars]
+        metrics, peaks, worst = extend(history, closes, peak, max_drawdown, windows)
+
+        ticker = symbol.replace(".NS", "")
+        places = [4 if column in PRICE_METRICS else 2 for column in metrics.columns]
+        for date, close, row in zip(dates, closes, metrics.itertuples(index=False, name=None)):
+            rows.append((ticker, interval, date, round(close, 4), *map(_value, row, places), updated_at))
+
+        # Only closed bars move the state forward; the open bar is recomputed on every run
+        closed = sum(bar_cache.period_end(d, interval) <= today for d in dates)
+        if closed:
+            new_state[symbol] = (
+                dates[closed - 1].isoformat(),
+                (list(history) + closes[:closed])[-keep:],
+                float(peaks[closed - 1]),
+                float(worst[closed - 1]),
+            )
+    return rows, new_state
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Upsert the Summary Table, Then Advance the State
+# ──────────────────────────────────────────────────────────────
+def update(symbols, interval="1mo", path=bar_cache.CACHE_PATH):
+    cache = connect(path)
+    try:
+        with db.session(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME) as conn:
+            cursor = conn.cursor()
+            # Rows are only ever added for new bars, so dropping or swapping the table would lose history
+            schema.prepare_table(cursor, TABLE, mode="upsert")
+
+            state = load_state(cache, interval)
+            if state and schema.last_value(cursor, TABLE, "date") is None:
+                logging.warning(f"⚠️ {TABLE} is empty; rebuilding it from the full bar history")
+                state = {}
+
+            rows, new_state = build_rows(cache, symbols, interval, state)
+            db.write_rows(conn, TABLE, COLUMNS, rows, update_columns=schema.update_columns(TABLE))
+            conn.commit()
+            cursor.close()
+
+        # Advanced only after MySQL has the rows; a failed run recomputes the same bars next time
+        save_state(cache, interval, new_state)
+        logging.info(f"✅ Rolling metrics updated for {len(rows)} {interval} bars.")
+        return len(rows)
+    except Exception as e:
+        logging.error(f"❌ MySQL Error: {e}")
+        return None
+    finally:
+        cache.close()
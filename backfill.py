@@ -0,0 +1,251 @@
+import os
+import argparse
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import analytics
+import bar_cache
+import columnar
+import db
+import fetcher
+import metrics
+import pipeline
+import schema
+import script1
+import script2
+import universe
+import validation
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+DB_HOST = os.getenv("DB_HOST")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+
+WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))
+# Calendar years per partition; rankings are per year and per month, so a partition never
+# needs bars from another one (apart from the lead-in bar below)
+PARTITION_YEARS = int(os.getenv("BACKFILL_PARTITION_YEARS", "1"))
+# One extra month before each partition, so a dividend in its first bar has a previous close
+LEAD_IN = datetime.timedelta(days=31)
+
+STAGES = ["yearly", "monthly"]
+TABLES = {"yearly": "yearly_top_performers", "monthly": "monthly_winners"}
+FIRST_YEAR = int(pipeline.MONTHLY_START[:4])
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Split the Range Into Year Partitions
+# ──────────────────────────────────────────────────────────────
+def partitions(start, end, years=PARTITION_YEARS):
+    first, last = max(start.year, FIRST_YEAR), end.year
+    return [(year, min(year + years - 1, last)) for year in range(first, last + 1, years)]
+
+
+# Same spelling universe.get_symbols gives the index lists, e.g. M&M -> MandM.NS
+def _normalise(ticker):
+    ticker = ticker.upper().replace("&", "and")
+    return ticker if ticker.endswith(".NS") else f"{ticker}.NS"
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Fetch and Compute One Partition
+# ──────────────────────────────────────────────────────────────
+# The backfilled tickers are downloaded again for the partition; every other ticker in the
+# ranking comes from the bar cache, which run() brought up to date once beforehand.
+# A partition missing any of them raises instead of ranking a partial universe, so its
+# stored rows are left alone rather than replaced.
+def load_partition(tickers, symbols, first_year, last_year):
+    start = (datetime.date(first_year, 1, 1) - LEAD_IN).isoformat()
+    end = datetime.date(last_year + 1, 1, 1).isoformat()
+
+    fresh = fetcher.download(tickers, start=start, end=end, interval="1mo")
+    if fresh is None:
+        raise RuntimeError(f"no bars downloaded for {', '.join(tickers)}")
+    frames = [columnar.to_long(fresh, tickers)]
+    # Long frames only keep bars with a price, so an all-NaN ticker has no rows at all
+    present = set(frames[0]["ticker"].astype(str))
+    empty = [t for t in tickers if t not in present]
+    if empty:
+        raise RuntimeError(f"no bars downloaded for {', '.join(empty)}")
+    others = [s for s in symbols if s not in tickers]
+
+    if pipeline.USE_BAR_CACHE:
+        conn = bar_cache.connect()
+        try:
+            for symbol in tickers:
+                bar_cache.replace_range(conn, symbol, "1mo", fresh[symbol], start, end)
+            conn.commit()
+            rest = bar_cache.load(conn, others, "1mo", start, end) if others else None
+        finally:
+            conn.close()
+    elif others:
+        data = fetcher.download(others, start=start, end=end, interval="1mo")
+        rest = columnar.to_long(data, others) if data is not None else None
+    else:
+        rest = None
+    if others and (rest is None or not len(rest)):
+        raise RuntimeError(f"no bars for the other {len(others)} tickers in the universe")
+    frames.append(rest)
+    return columnar.concat(frames, symbols)
+
+
+def compute_partition(tickers, symbols, first_year, last_year, actions, stages):
+    with metrics.stage(f"backfill:{first_year}-{last_year}", rows_in=len(symbols)) as stage:
+        data = load_partition(tickers, symbols, first_year, last_year)
+        quarantined = []
+        if validation.ENABLED:
+            data, quarantined = validation.validate(data, symbols, "1mo")
+
+        results = {"quarantine": quarantined}
+        if "yearly" in stages and last_year >= int(pipeline.YEARLY_START[:4]):
+            yearly_returns = script1.compute_yearly_returns(
+                data.loc[data.index >= pipeline.YEARLY_START], symbols, actions
+            )
+            # The lead-in bar forms a one-bar "year" of its own; it belongs to the previous partition
+            yearly_returns = yearly_returns.loc[
+                (yearly_returns.index >= first_year) & (yearly_returns.index <= last_year)
+            ]
+            top_performers = script1.identify_top_performers(yearly_returns)
+            if validation.ENABLED:
+                top_performers, held = validation.split_out_of_range(top_performers)
+                results["quarantine"] += held
+            results["yearly"] = top_performers
+        if "monthly" in stages:
+            winners = script2.get_monthly_winners(data, symbols, actions)
+            results["monthly"] = [w for w in winners if first_year <= w["date"].year <= last_year]
+        stage.rows_out = len(results.get("yearly", [])) + len(results.get("monthly", []))
+    return results
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Replace the Derived Rows of the Computed Partitions Only
+# ──────────────────────────────────────────────────────────────
+# The daily upsert treats earlier years / months as final, so a backfill deletes and rewrites
+# each computed partition's rows in one transaction. It never drops or swaps the table.
+def replace_partitions(results, stages):
+    try:
+        with db.session(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME) as conn:
+            cursor = conn.cursor()
+            written = 0
+            for stage in stages:
+                table = TABLES[stage]
+                schema.prepare_table(cursor, table, mode="upsert")
+                for (first_year, last_year), result in sorted(results.items()):
+                    # An empty result would only delete what is stored
+                    if not result.get(stage):
+                        continue
+                    if stage == "yearly":
+                        cursor.execute(f"DELETE FROM {table} WHERE year BETWEEN %s AND %s", (first_year, last_year))
+                        columns, rows = script1.COLUMNS, result["yearly"]
+                    else:
+                        cursor.execute(
+                            f"DELETE FROM {table} WHERE date BETWEEN %s AND %s",
+                            (datetime.date(first_year, 1, 1), datetime.date(last_year, 12, 31))
+                        )
+                        columns, rows = script2.COLUMNS, script2.to_rows(result["monthly"])
+                    db.write_rows(conn, table, columns, rows, update_columns=schema.update_columns(table))
+                    written += len(rows)
+            conn.commit()
+            for stage in stages:
+                schema.bump_generation(cursor, TABLES[stage])
+            conn.commit()
+            cursor.close()
+        logging.info(f"✅ Backfill replaced {written} rows in {len(results)} partitions.")
+        return True
+    except Exception as e:
+        logging.error(f"❌ MySQL Error: {e}")
+        return False
+
+# ──────────────────────────────────────────────────────────────
+# STEP 4: Backfill
+# ──────────────────────────────────────────────────────────────
+def run(tickers, start, end=None, stages=STAGES, workers=None, index=None):
+    end = end or datetime.date.today()
+    workers = workers or WORKERS
+    tickers = [_normalise(t) for t in tickers]
+    index = index or pipeline.UNIVERSE
+    parts = partitions(start, end)
+    if not parts:
+        logging.error(f"❌ Nothing to backfill between {start} and {end} (bars start in {FIRST_YEAR}).")
+        return False
+
+    # Rankings compare the whole universe, so every ticker in it is part of each partition;
+    # a ticker being added joins them even before the index list has it
+    symbols = universe.get_symbols(index)[:pipeline.TOP_N_SYMBOLS]
+    if not symbols:
+        logging.error("❌ No symbols fetched. Exiting.")
+        return False
+    symbols += [t for t in tickers if t not in symbols]
+
+    actions = pipeline.fetch_actions(symbols)
+    if actions is None:
+        return False
+    others = [s for s in symbols if s not in tickers]
+    if pipeline.USE_BAR_CACHE and others:
+        conn = bar_cache.connect()
+        try:
+            with metrics.stage("backfill:cache", rows_in=len(others)):
+                bar_cache.refresh(conn, others, "1mo", pipeline.MONTHLY_START, datetime.date.today().isoformat())
+        finally:
+            conn.close()
+
+    logging.info(
+        f"⏳ Backfilling {', '.join(tickers)} over {len(parts)} partitions "
+        f"({parts[0][0]}-{parts[-1][1]}) on {workers} threads..."
+    )
+    ok = True
+    results = {}
+    # The partitions' downloads share fetcher's process-wide token bucket
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(metrics.bind(compute_partition), tickers, symbols, first, last, actions, stages): (first, last)
+            for first, last in parts
+        }
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                logging.error(f"❌ Backfill partition {futures[future]} failed: {e}")
+                ok = False
+
+    quarantined = [row for result in results.values() for row in result.pop("quarantine")]
+    ok &= validation.store_quarantine(quarantined)
+    if any(results.values()):
+        ok &= replace_partitions(results, stages)
+
+    # Rolling metrics of the corrected tickers are rebuilt from their full cached history. A ticker
+    # the cache has never fully covered is left to the next pipeline run, which downloads it all.
+    if ok and pipeline.USE_BAR_CACHE:
+        cache = analytics.connect()
+        try:
+            cached = [t for (t,) in cache.execute("SELECT ticker FROM bar_meta WHERE interval = '1mo'") if t in tickers]
+            cache.executemany("DELETE FROM rolling_state WHERE ticker = ? AND interval = '1mo'", [(t,) for t in cached])
+            cache.commit()
+        finally:
+            cache.close()
+        if cached:
+            ok &= analytics.update(cached, "1mo") is not None
+    return ok
+
+# ──────────────────────────────────────────────────────────────
+# MAIN
+# ──────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute yearly and monthly rankings for a date range")
+    parser.add_argument("--tickers", nargs="+", required=True, help="tickers to re-download, e.g. RELIANCE INFY")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, help="YYYY-MM-DD (default: today)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--universe", help="index list the rankings are drawn from (default: UNIVERSE)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+    if args.end and args.start > args.end:
+        parser.error("--start must not be after --end")
+    if (args.end or datetime.date.today()).year < FIRST_YEAR:
+        parser.error(f"--end must be in {FIRST_YEAR} or later")
+
+    ok = run(args.tickers, args.start, args.end, args.stages, args.workers, args.universe)
+    metrics.write_prometheus()
+    if not ok:
+        exit(1)
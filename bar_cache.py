@@ -0,0 +1,218 @@
+import os
+import sqlite3
+import datetime
+import logging
+
+import pandas as pd
+
+import columnar
+import fetcher
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+CACHE_PATH = os.getenv("BAR_CACHE_PATH", os.path.join(".cache", "bars.sqlite"))
+# How long a still-open bar (current month / today) is trusted before it is re-fetched
+OPEN_BAR_TTL = datetime.timedelta(hours=float(os.getenv("BAR_CACHE_OPEN_TTL_HOURS", "6")))
+
+FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+COLUMNS = ["open", "high", "low", "close", "adj_close", "volume"]
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Open the Store
+# ──────────────────────────────────────────────────────────────
+def connect(path=CACHE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Runner workers share the file, so wait for another process's write instead of failing
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    # Bars are clustered by (ticker, interval) so each partition is one contiguous range scan
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bars (
+            ticker TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            date TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            adj_close REAL,
+            volume REAL,
+            PRIMARY KEY (ticker, interval, date)
+        ) WITHOUT ROWID;
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bar_meta (
+            ticker TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            covered_start TEXT NOT NULL,
+            last_date TEXT,
+            fetched_at TEXT NOT NULL,
+            PRIMARY KEY (ticker, interval)
+        ) WITHOUT ROWID;
+    """)
+    return conn
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Staleness / Revalidation Policy
+# ──────────────────────────────────────────────────────────────
+def period_end(date, interval):
+    if interval == "1mo":
+        return (date.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+    if interval == "3mo":
+        month = date.month - (date.month - 1) % 3 + 3
+        return datetime.date(date.year + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+    if interval == "1wk":
+        return date + datetime.timedelta(days=7)
+    return date + datetime.timedelta(days=1)
+
+
+# Returns the date to download from, or None when the cached bars are still good
+def fetch_start(meta, start, interval, now):
+    if meta is None:
+        return start
+
+    covered_start, last_date, fetched_at = meta
+    if covered_start > start:
+        return start
+
+    fetched_at = datetime.datetime.fromisoformat(fetched_at)
+    if last_date is None:
+        return None if now - fetched_at < OPEN_BAR_TTL else start
+
+    last_date = datetime.date.fromisoformat(last_date)
+    closes_at = period_end(last_date, interval)
+    if closes_at > now.date():
+        # Last bar is still open: trust it for OPEN_BAR_TTL, then revalidate it
+        return None if now - fetched_at < OPEN_BAR_TTL else last_date.isoformat()
+    if fetched_at.date() < closes_at:
+        # Stored before its period closed, so the final values were never seen
+        return last_date.isoformat()
+    return closes_at.isoformat()
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Download Only the Missing Tail
+# ──────────────────────────────────────────────────────────────
+def _rows(symbol, interval, frame):
+    frame = frame.reindex(columns=FIELDS).dropna(how="all")
+    return [
+        (symbol, interval, date.date().isoformat(), *values)
+        for date, values in zip(
+            pd.to_datetime(frame.index),
+            frame.astype(float).itertuples(index=False, name=None)
+        )
+    ]
+
+
+def _store(conn, symbol, interval, frame, covered_start, now):
+    rows = _rows(symbol, interval, frame)
+    conn.executemany("""
+        INSERT OR REPLACE INTO bars
+        (ticker, interval, date, open, high, low, close, adj_close, volume)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+    last_date = conn.execute(
+        "SELECT MAX(date) FROM bars WHERE ticker = ? AND interval = ?", (symbol, interval)
+    ).fetchone()[0]
+    conn.execute("""
+        INSERT INTO bar_meta (ticker, interval, covered_start, last_date, fetched_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (ticker, interval) DO UPDATE SET
+            covered_start = MIN(covered_start, excluded.covered_start),
+            last_date = excluded.last_date,
+            fetched_at = excluded.fetched_at
+    """, (symbol, interval, covered_start, last_date, now.isoformat()))
+    return len(rows)
+
+
+def refresh(conn, symbols, interval, start, end):
+    now = datetime.datetime.now()
+    meta = {
+        row[0]: row[1:]
+        for row in conn.execute(
+            "SELECT ticker, covered_start, last_date, fetched_at FROM bar_meta WHERE interval = ?",
+            (interval,)
+        )
+    }
+
+    # Tickers that need the same tail are fetched together in one request
+    groups = {}
+    for symbol in symbols:
+        since = fetch_start(meta.get(symbol), start, interval, now)
+        if since is not None and (end is None or since < end):
+            groups.setdefault(since, []).append(symbol)
+
+    if not groups:
+        logging.info(f"✅ Bar cache hit for all {len(symbols)} symbols ({interval})")
+        return 0
+
+    stored = 0
+    for since, group in sorted(groups.items()):
+        logging.info(f"⏳ Fetching {interval} bars for {len(group)} symbols since {since}...")
+        data = fetcher.download(group, start=since, end=end, interval=interval)
+        if data is None or data.empty:
+            continue
+        for symbol in group:
+            # Failed symbols come back as all-NaN columns; leave their metadata alone so they are retried
+            if data[symbol].notna().any().any():
+                stored += _store(conn, symbol, interval, data[symbol], min(since, start), now)
+        conn.commit()
+
+    logging.info(f"✅ Stored {stored} {interval} bars in cache")
+    return stored
+
+# Overwrites a ticker's bars in [start, end) with a fresh download (backfill.py). bar_meta is
+# left alone: its fetch time still describes the tail, which this range may not include
+def replace_range(conn, symbol, interval, frame, start, end):
+    conn.execute(
+        "DELETE FROM bars WHERE ticker = ? AND interval = ? AND date >= ? AND date < ?",
+        (symbol, interval, start, end)
+    )
+    rows = _rows(symbol, interval, frame)
+    conn.executemany("""
+        INSERT OR REPLACE INTO bars
+        (ticker, interval, date, open, high, low, close, adj_close, volume)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+# Drops a (ticker, interval) so the next refresh downloads its full history again, e.g. after
+# Yahoo restated it for a split; rolling state derived from those bars goes with them
+def invalidate(conn, symbol, interval):
+    conn.execute("DELETE FROM bars WHERE ticker = ? AND interval = ?", (symbol, interval))
+    conn.execute("DELETE FROM bar_meta WHERE ticker = ? AND interval = ?", (symbol, interval))
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rolling_state'").fetchone():
+        conn.execute("DELETE FROM rolling_state WHERE ticker = ? AND interval = ?", (symbol, interval))
+
+# ──────────────────────────────────────────────────────────────
+# STEP 4: Serve Frames Shaped Like yf.download(group_by="ticker")
+# ──────────────────────────────────────────────────────────────
+def load(conn, symbols, interval, start, end=None):
+    placeholders = ", ".join("?" for _ in symbols)
+    columns = ", ".join(COLUMNS)
+    query = f"""
+        SELECT ticker, date, {columns} FROM bars
+        WHERE interval = ? AND ticker IN ({placeholders}) AND date >= ?
+    """
+    params = [interval, *symbols, start]
+    if end is not None:
+        query += " AND date < ?"
+        params.append(end)
+
+    long = pd.read_sql_query(query, conn, params=params, parse_dates=["date"])
+    long = long.rename(columns=dict(zip(COLUMNS, FIELDS)))
+    # Rows already arrive one per bar, so they go straight into the long layout without a pivot
+    return columnar.from_records(long, symbols)
+
+
+def cached_download(symbols, interval, start, end=None, path=CACHE_PATH):
+    conn = connect(path)
+    try:
+        refresh(conn, symbols, interval, start, end)
+        return load(conn, symbols, interval, start, end)
+    finally:
+        conn.close()
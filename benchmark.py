@@ -0,0 +1,251 @@
+import json
+import time
+import argparse
+import datetime
+import logging
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import columnar
+import fake_mysql
+import script1
+import script2
+import script3
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Synthetic yf.download(group_by="ticker") Frames
+# ──────────────────────────────────────────────────────────────
+def make_download_frame(n_tickers, start="1990-01-01", end=None, freq="MS", seed=42):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, end or datetime.date.today(), freq=freq, name="Date")
+    n = len(index)
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0.005, 0.08, (n, n_tickers)), axis=0))
+    open_ = close * np.exp(rng.normal(0, 0.05, (n, n_tickers)))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.05, (n, n_tickers)))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.05, (n, n_tickers)))
+    volume = rng.integers(10_000, 10_000_000, (n, n_tickers)).astype("float64")
+    volume[rng.random((n, n_tickers)) < 0.01] = np.nan
+
+    # Later listings: each ticker starts trading somewhere in the first third of the range
+    listed = np.arange(n)[:, None] >= rng.integers(0, max(n // 3, 1), n_tickers)
+    fields = {"Open": open_, "High": high, "Low": low, "Close": close,
+              "Adj Close": close * 0.97, "Volume": volume}
+
+    symbols = [f"SYN{i:03d}.NS" for i in range(n_tickers)]
+    columns = pd.MultiIndex.from_product([symbols, list(fields)])
+    values = np.stack([np.where(listed, fields[f], np.nan) for f in fields], axis=2)
+    return pd.DataFrame(values.reshape(n, -1), index=index, columns=columns), symbols
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Reference Month × Symbol Loop (pre-vectorisation)
+# ──────────────────────────────────────────────────────────────
+def legacy_monthly_winners(data, symbols):
+    monthly_winners = []
+    months = pd.date_range("1990-01-01", datetime.date.today(), freq="MS")
+
+    for month in months:
+        month_records = []
+
+        for symbol in symbols:
+            try:
+                symbol_df = data[symbol].dropna(subset=["Open", "Close"])
+                row = symbol_df[(symbol_df.index.month == month.month) & (symbol_df.index.year == month.year)]
+                if row.empty:
+                    continue
+
+                row = row.iloc[0]
+                gain_pct = ((row["Close"] - row["Open"]) / row["Open"]) * 100
+
+                month_records.append({
+                    "symbol": symbol.replace(".NS", ""),
+                    "date": row.name.date(),
+                    "open": float(row["Open"]),
+                    "high": float(row["High"]),
+                    "low": float(row["Low"]),
+                    "close": float(row["Close"]),
+                    "adj_close": float(row.get("Adj Close", row["Close"])),
+                    "volume": int(row["Volume"]),
+                    "gain_pct": round(gain_pct, 2),
+                    "inserted_at": datetime.datetime.now()
+                })
+
+            except Exception:
+                pass
+
+        if month_records:
+            best = max(month_records, key=lambda x: x["gain_pct"])
+            monthly_winners.append(best)
+
+    return monthly_winners
+
+def legacy_yearly_top_performers(data, symbols):
+    all_yearly_returns = {}
+
+    for symbol in symbols:
+        df = data[symbol].dropna()
+        df.index = pd.to_datetime(df.index)
+        df = df.resample(YEAR_END).agg({
+            'Open': 'first',
+            'Close': 'last'
+        }).dropna()
+        df['return_pct'] = ((df['Close'] - df['Open']) / df['Open']) * 100
+
+        for year, row in df.iterrows():
+            all_yearly_returns.setdefault(year.year, []).append({
+                "symbol": symbol.replace(".NS", ""),
+                "return_pct": round(row["return_pct"], 2)
+            })
+
+    top_performers = []
+    for year in sorted(all_yearly_returns.keys()):
+        best = max(all_yearly_returns[year], key=lambda x: x["return_pct"])
+        top_performers.append((year, 1, best["symbol"], best["return_pct"]))
+    return top_performers
+
+
+try:
+    YEAR_END = pd.tseries.frequencies.to_offset("YE").freqstr
+except ValueError:
+    YEAR_END = "Y"
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Benchmark
+# ──────────────────────────────────────────────────────────────
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def _strip(records):
+    return [{k: v for k, v in r.items() if k != "inserted_at"} for r in records]
+
+
+def bench_monthly_winners(sizes=(25, 50, 100, 250, 500)):
+    logging.getLogger().setLevel(logging.WARNING)
+    results = []
+    for n in sizes:
+        data, symbols = make_download_frame(n)
+        fast, fast_s = _timed(script2.get_monthly_winners, data, symbols)
+        slow, slow_s = _timed(legacy_monthly_winners, data, symbols)
+        if _strip(fast) != _strip(slow):
+            raise AssertionError(f"Vectorised winners differ from the loop for {n} tickers")
+        results.append((n, slow_s, fast_s))
+        print(f"{n:>4} tickers | loop {slow_s:8.3f}s | vectorised {fast_s:7.4f}s | {slow_s / fast_s:7.1f}x")
+    return results
+
+def bench_yearly_top_performers(sizes=(25, 50, 100, 250, 500)):
+    logging.getLogger().setLevel(logging.WARNING)
+    results = []
+    for n in sizes:
+        data, symbols = make_download_frame(n, start="1992-01-01")
+        fast, fast_s = _timed(
+            lambda: script1.identify_top_performers(script1.compute_yearly_returns(data, symbols), top_n=1)
+        )
+        slow, slow_s = _timed(legacy_yearly_top_performers, data, symbols)
+        if fast != slow:
+            raise AssertionError(f"Vectorised yearly ranking differs from the loop for {n} tickers")
+        results.append((n, slow_s, fast_s))
+        print(f"{n:>4} tickers | yearly loop {slow_s:8.3f}s | vectorised {fast_s:7.4f}s | {slow_s / fast_s:7.1f}x")
+    return results
+
+# ──────────────────────────────────────────────────────────────
+# STEP 4: Per-stage Suite Against the Local DB Stand-in
+# ──────────────────────────────────────────────────────────────
+def _measure(name, n_tickers, rows_in, fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {
+        "stage": name,
+        "tickers": n_tickers,
+        "seconds": round(elapsed, 4),
+        "rows_in": rows_in,
+        "rows_per_second": round(rows_in / elapsed, 1) if elapsed else None,
+        "peak_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+def run_suite(sizes=(25, 100, 500), years=35, db_latency_ms=0.0):
+    logging.getLogger().setLevel(logging.WARNING)
+    start = f"{datetime.date.today().year - years}-01-01"
+    results = []
+
+    for n in sizes:
+        monthly, symbols = make_download_frame(n, start=start)
+        daily, _ = make_download_frame(n, start=datetime.date.today() - datetime.timedelta(days=5), freq="D")
+        bars = columnar.bar_count(monthly)
+        monthly, stats = _measure("to_long", n, bars, columnar.to_long, monthly, symbols)
+        results.append(stats)
+        daily = columnar.to_long(daily, symbols)
+
+        yearly, stats = _measure("yearly_transform", n, bars, script1.compute_yearly_returns, monthly, symbols)
+        results.append(stats)
+        top, stats = _measure("yearly_rank", n, int(yearly.notna().to_numpy().sum()),
+                              script1.identify_top_performers, yearly)
+        results.append(stats)
+        winners, stats = _measure("monthly_winners", n, bars, script2.get_monthly_winners, monthly, symbols)
+        results.append(stats)
+        records, stats = _measure("daily_records", n, columnar.bar_count(daily),
+                                  script3.build_daily_records, daily, symbols)
+        results.append(stats)
+
+        for name, fn, rows, table in (
+            ("yearly_store", script1.store_in_mysql, top, "yearly_top_performers"),
+            ("monthly_store", script2.save_to_mysql, winners, "monthly_winners"),
+            ("daily_store", script3.refresh_mysql_data, records, "stock_data"),
+        ):
+            conn = fake_mysql.FakeConnection(latency=db_latency_ms / 1000)
+            with fake_mysql.patched_connect(conn):
+                _, stats = _measure(name, n, len(rows), fn, rows)
+            # The stores also bump refresh_generations; only the data table's rows are compared
+            if conn.rows.get(table, 0) != len(rows):
+                raise AssertionError(f"{name} wrote {conn.rows} for {len(rows)} rows")
+            stats["round_trips"] = conn.round_trips
+            results.append(stats)
+
+    return results
+
+
+def print_results(results):
+    header = f"{'stage':<18}{'tickers':>8}{'seconds':>10}{'rows in':>10}{'rows/s':>14}{'peak MB':>10}{'round trips':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['stage']:<18}{r['tickers']:>8}{r['seconds']:>10.4f}{r['rows_in']:>10}"
+            f"{r['rows_per_second'] or 0:>14,.0f}{r['peak_mb']:>10.2f}{r.get('round_trips', ''):>13}"
+        )
+
+# ──────────────────────────────────────────────────────────────
+# MAIN
+# ──────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the refresh pipeline")
+    parser.add_argument("--tickers", type=int, nargs="+", default=[25, 100, 500])
+    parser.add_argument("--years", type=int, default=35)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0,
+                        help="simulated latency per DB round trip")
+    parser.add_argument("--json", help="also append the results as JSON lines to this file")
+    parser.add_argument("--compare-legacy", action="store_true",
+                        help="also check parity and speed-up against the original loops (slow)")
+    args = parser.parse_args()
+
+    results = run_suite(args.tickers, args.years, args.db_latency_ms)
+    print_results(results)
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+
+    if args.compare_legacy:
+        bench_yearly_top_performers(args.tickers)
+        bench_monthly_winners(args.tickers)
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import argparse
+import builtins
+import logging
+import contextlib
+
+# Only the standard library is imported up here. The stage modules, and pandas, yfinance and
+# mysql.connector with them, are loaded after the arguments are parsed and only when needed.
+
+STAGES = ["yearly", "monthly", "daily"]
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Import-time Report
+# ──────────────────────────────────────────────────────────────
+# Records the inclusive wall time of the first import of each top-level package, including
+# the lazy imports that happen later inside the stages (yfinance on the first fetch, ...)
+class ImportTimer:
+    def __init__(self):
+        self.times = {}
+        self._original = None
+
+    def __enter__(self):
+        self._original = original = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            top = name.partition(".")[0]
+            if level or top in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            started = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self.times.setdefault(top, time.perf_counter() - started)
+
+        builtins.__import__ = timed_import
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        builtins.__import__ = self._original
+        return False
+
+    def report(self, min_ms=5):
+        rows = sorted(self.times.items(), key=lambda item: item[1], reverse=True)
+        logging.info("📦 First-import times (inclusive, ms):")
+        for name, seconds in rows:
+            if seconds * 1000 >= min_ms:
+                logging.info(f"   {name:<24} {seconds * 1000:8.1f}")
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Commands
+# ──────────────────────────────────────────────────────────────
+def dry_run(stages):
+    import manifest
+    import universe
+
+    index = os.getenv("UNIVERSE", "nifty50")
+    symbols = universe.get_symbols(index)
+    # Only reads today's manifest; opening it with --fresh would delete the checkpoints
+    done = manifest.peek(manifest.run_key(index))
+    logging.info(f"🧪 Dry run: {len(symbols)} {index} symbols, stages {', '.join(stages)}")
+    for name in done:
+        if manifest.RESUME:
+            logging.info(f"   already done today: {name}")
+        else:
+            logging.info(f"   done today, would be redone (--fresh): {name}")
+    return bool(symbols)
+
+
+def run(stages):
+    import manifest
+    import metrics
+    import pipeline
+
+    manifest.prune()
+    ok = pipeline.run(stages=stages)
+    metrics.write_prometheus()
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the Nifty tables in MySQL")
+    parser.add_argument("command", choices=STAGES + ["all"], help="stage to run, or all of them in one process")
+    parser.add_argument("--universe", help="index list to run on (overrides UNIVERSE)")
+    parser.add_argument("--fresh", action="store_true", help="ignore today's checkpoints and start over")
+    parser.add_argument("--dry-run", action="store_true", help="resolve the universe and show the plan only")
+    parser.add_argument("--import-report", action="store_true", help="log how long each package took to import")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # The modules read their configuration at import time, so set it before they load
+    if args.universe:
+        os.environ["UNIVERSE"] = args.universe
+    if args.fresh:
+        os.environ["RESUME"] = "0"
+    stages = STAGES if args.command == "all" else [args.command]
+
+    started = time.perf_counter()
+    timer = ImportTimer() if args.import_report else contextlib.nullcontext()
+    with timer:
+        ok = dry_run(stages) if args.dry_run else run(stages)
+    if args.import_report:
+        timer.report()
+        logging.info(f"⏱️ Total {time.perf_counter() - started:.2f}s")
+    return 0 if ok else 1
+
+# ──────────────────────────────────────────────────────────────
+# MAIN
+# ──────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    sys.exit(main())
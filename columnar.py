@@ -0,0 +1,203 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+import threading
+import multiprocessing.util
+
+import numpy as np
+import pandas as pd
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+# memory -> keep the long frame on the heap
+# arrow  -> spill to an Arrow IPC file and read it back memory-mapped (needs pyarrow)
+# npy    -> spill one .npy per column and np.load(mmap_mode="r") them
+BACKEND = os.getenv("COLUMNAR_BACKEND", "memory")
+# Parent of the per-run spill directory (default: the system temp dir). Never point it into
+# .cache: the workflow persists that directory between runs.
+SPILL_DIR = os.getenv("COLUMNAR_DIR") or None
+
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Adj Close"]
+FIELDS = PRICE_FIELDS + ["Volume"]
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Wide yf.download Frame -> Compact Long Frame
+# ──────────────────────────────────────────────────────────────
+# One row per (date, ticker) bar: datetime64 index, categorical ticker,
+# float32 prices and nullable int64 volume.
+def is_long(data):
+    return not isinstance(data.columns, pd.MultiIndex) and "ticker" in data.columns
+
+
+def symbols_in(data):
+    if is_long(data):
+        return list(data["ticker"].cat.categories)
+    return list(dict.fromkeys(data.columns.get_level_values(0)))
+
+
+def _volume_array(values):
+    values = np.asarray(values, dtype="float64")
+    missing = np.isnan(values)
+    return pd.arrays.IntegerArray(np.where(missing, 0, values).astype("int64"), missing)
+
+
+def to_long(data, symbols=None):
+    if is_long(data):
+        return data
+    symbols = list(symbols or symbols_in(data))
+    dates, matrices = panel(data, symbols)
+
+    present = np.zeros(matrices["Close"].shape, dtype=bool)
+    for field in PRICE_FIELDS:
+        present |= ~np.isnan(matrices[field])
+    rows, cols = np.nonzero(present)
+
+    columns = {"ticker": pd.Categorical.from_codes(cols, categories=symbols)}
+    for field in PRICE_FIELDS:
+        columns[field] = matrices[field][rows, cols].astype("float32")
+    columns["Volume"] = _volume_array(matrices["Volume"][rows, cols])
+
+    long = pd.DataFrame(columns, index=pd.DatetimeIndex(dates[rows], name="Date"))
+    return spill(long)
+
+
+def from_records(frame, symbols):
+    # frame: one row per bar with a "ticker" column, a "date" column and the Yahoo field names
+    long = pd.DataFrame(
+        {"ticker": pd.Categorical(frame["ticker"], categories=list(symbols))},
+        index=pd.DatetimeIndex(pd.to_datetime(frame["date"]), name="Date")
+    )
+    for field in PRICE_FIELDS:
+        long[field] = frame[field].to_numpy(dtype="float32")
+    long["Volume"] = _volume_array(frame["Volume"])
+    return spill(long.sort_index(kind="stable"))
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Dense (date x ticker) Matrices for the Transforms
+# ──────────────────────────────────────────────────────────────
+# Accepts either layout and returns float64 matrices in `symbols` column order;
+# a missing "Adj Close" falls back to "Close", like row.get("Adj Close", row["Close"]).
+def panel(data, symbols, fields=FIELDS):
+    if is_long(data):
+        dates = pd.DatetimeIndex(data.index.unique().sort_values())
+        rows = dates.get_indexer(data.index)
+        codes = data["ticker"].cat.codes.to_numpy()
+        lookup = np.full(len(data["ticker"].cat.categories) + 1, -1)
+        positions = pd.Index(data["ticker"].cat.categories).get_indexer(symbols)
+        lookup[positions[positions >= 0]] = np.flatnonzero(positions >= 0)
+        cols = lookup[codes]
+        keep = cols >= 0
+
+        matrices = {}
+        for field in fields:
+            source = field if field in data.columns else "Close"
+            values = data[source].to_numpy(dtype="float64", na_value=np.nan)
+            matrix = np.full((len(dates), len(symbols)), np.nan)
+            matrix[rows[keep], cols[keep]] = values[keep]
+            matrices[field] = matrix
+        return dates, matrices
+
+    frame = data if data.index.is_monotonic_increasing else data.sort_index()
+    dates = pd.DatetimeIndex(pd.to_datetime(frame.index))
+    available = set(frame.columns.get_level_values(1))
+    matrices = {}
+    for field in fields:
+        source = field if field in available else "Close"
+        matrices[field] = (
+            frame.xs(source, axis=1, level=1).reindex(columns=symbols).to_numpy(dtype="float64")
+        )
+    return dates, matrices
+
+
+# One field at the given (row, column) positions of panel(); the dense matrix only lives for the
+# call, so a transform that needs a field at a few bars never holds it next to the others
+def field_at(data, symbols, field, rows, cols):
+    return panel(data, symbols, fields=[field])[1][field][rows, cols]
+
+
+def concat(frames, symbols):
+    # Long frames for different tickers (e.g. a fresh download plus cached bars) as one frame
+    frames = [frame for frame in frames if frame is not None and len(frame)]
+    if not frames:
+        return from_records(pd.DataFrame(columns=["ticker", "date"] + FIELDS), symbols)
+    long = pd.concat([frame.assign(ticker=frame["ticker"].astype(str)) for frame in frames])
+    long["ticker"] = pd.Categorical(long["ticker"], categories=list(symbols))
+    return long.sort_index(kind="stable")
+
+
+def bar_count(data):
+    if is_long(data):
+        return int(data["Close"].notna().sum())
+    return int(data.xs("Close", axis=1, level=1).notna().to_numpy().sum())
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Optional Arrow / Memory-mapped Backing
+# ──────────────────────────────────────────────────────────────
+_run_dirs = {}
+_run_dir_lock = threading.Lock()
+
+
+# One directory per process for its spill files, removed with everything in it at exit. A
+# multiprocessing finalizer also runs when a runner.py pool worker exits, which atexit does not.
+def run_dir():
+    pid = os.getpid()
+    with _run_dir_lock:
+        if pid not in _run_dirs:
+            if SPILL_DIR:
+                os.makedirs(SPILL_DIR, exist_ok=True)
+            path = tempfile.mkdtemp(prefix="columnar-", dir=SPILL_DIR)
+            multiprocessing.util.Finalize(None, shutil.rmtree, args=(path,), kwargs={"ignore_errors": True}, exitpriority=0)
+            _run_dirs[pid] = path
+        return _run_dirs[pid]
+
+
+def spill(long, backend=None, directory=None):
+    backend = backend or BACKEND
+    if backend == "memory":
+        return long
+    directory = directory or run_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    if backend == "arrow":
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        path = os.path.join(directory, f"bars-{os.getpid()}-{id(long)}.arrow")
+        feather.write_feather(long.reset_index(), path, compression="uncompressed")
+        with pa.memory_map(path) as source:
+            table = feather.read_table(source, memory_map=True)
+        restored = table.to_pandas(
+            self_destruct=True, split_blocks=True,
+            types_mapper={pa.int64(): pd.Int64Dtype()}.get
+        )
+        return restored.set_index("Date")
+
+    if backend == "npy":
+        base = os.path.join(directory, f"bars-{os.getpid()}-{id(long)}")
+        np.save(f"{base}.dates.npy", long.index.to_numpy())
+        np.save(f"{base}.codes.npy", long["ticker"].cat.codes.to_numpy())
+        for i, field in enumerate(FIELDS):
+            values = long[field].to_numpy(dtype="float32" if field != "Volume" else "float64", na_value=np.nan)
+            np.save(f"{base}.{i}.npy", values)
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump({"tickers": list(long["ticker"].cat.categories)}, f)
+        return load_npy(base)
+
+    raise ValueError(f"Unknown columnar backend: {backend}")
+
+
+def load_npy(base):
+    with open(f"{base}.json", encoding="utf-8") as f:
+        tickers = json.load(f)["tickers"]
+    columns = {
+        "ticker": pd.Categorical.from_codes(np.load(f"{base}.codes.npy", mmap_mode="r"), categories=tickers)
+    }
+    for i, field in enumerate(FIELDS):
+        values = np.load(f"{base}.{i}.npy", mmap_mode="r")
+        columns[field] = _volume_array(values) if field == "Volume" else values
+    dates = np.load(f"{base}.dates.npy", mmap_mode="r")
+    logging.info(f"🗂️ Bars memory-mapped from {base}.*.npy")
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(dates, name="Date"), copy=False)
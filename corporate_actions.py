@@ -0,0 +1,255 @@
+import os
+import datetime
+import logging
+
+import numpy as np
+import pandas as pd
+
+import bar_cache
+import fetcher
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+# total -> dividends reinvested on the ex-date; price -> price change only (the old behaviour)
+RETURN_MODE = os.getenv("RETURN_MODE", "total")
+# Each ticker's actions are re-checked at most this often, and only since the last check
+MAX_AGE = datetime.timedelta(hours=float(os.getenv("ACTIONS_MAX_AGE_HOURS", "20")))
+OVERLAP_DAYS = 7
+# How far either side of a split to look for the closes that show which basis the cache is on
+SPLIT_WINDOW = datetime.timedelta(days=100)
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Action Cache Next to the Bars
+# ──────────────────────────────────────────────────────────────
+def connect(path=bar_cache.CACHE_PATH):
+    conn = bar_cache.connect(path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS actions (
+            ticker TEXT NOT NULL,
+            date TEXT NOT NULL,
+            dividend REAL NOT NULL,
+            split REAL NOT NULL,
+            PRIMARY KEY (ticker, date)
+        ) WITHOUT ROWID;
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS actions_meta (
+            ticker TEXT PRIMARY KEY,
+            fetched_at TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """)
+    return conn
+
+
+def load(conn, symbols):
+    placeholders = ", ".join("?" for _ in symbols)
+    return pd.read_sql_query(
+        f"SELECT ticker, date, dividend, split FROM actions WHERE ticker IN ({placeholders}) ORDER BY date",
+        conn, params=list(symbols), parse_dates=["date"]
+    )
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Incremental Refresh
+# ──────────────────────────────────────────────────────────────
+def _store(conn, symbol, frame, now, replace=False):
+    if replace:
+        conn.execute("DELETE FROM actions WHERE ticker = ?", (symbol,))
+    conn.executemany("INSERT OR REPLACE INTO actions (ticker, date, dividend, split) VALUES (?, ?, ?, ?)", [
+        (symbol, date.date().isoformat(), float(dividend), float(split))
+        for date, dividend, split in zip(frame.index, frame["Dividends"], frame["Stock Splits"])
+    ])
+    conn.execute("INSERT OR REPLACE INTO actions_meta (ticker, fetched_at) VALUES (?, ?)", (symbol, now.isoformat()))
+
+
+def refresh(conn, symbols, now=None):
+    now = now or datetime.datetime.now()
+    meta = {
+        ticker: datetime.datetime.fromisoformat(fetched_at)
+        for ticker, fetched_at in conn.execute("SELECT ticker, fetched_at FROM actions_meta")
+    }
+
+    # None -> full history; otherwise a short overlapping tail since the last check
+    groups = {}
+    for symbol in symbols:
+        fetched_at = meta.get(symbol)
+        if fetched_at is None:
+            groups.setdefault(None, []).append(symbol)
+        elif now - fetched_at >= MAX_AGE:
+            since = (fetched_at.date() - datetime.timedelta(days=OVERLAP_DAYS)).isoformat()
+            groups.setdefault(since, []).append(symbol)
+
+    if not groups:
+        logging.info(f"✅ Corporate actions cached for all {len(symbols)} symbols")
+        return [], []
+
+    # paid: (ticker, ex-date, amount) of each dividend the incremental check sees for the first time
+    restated = []
+    paid = []
+    for since, group in groups.items():
+        logging.info(f"⏳ Fetching corporate actions for {len(group)} symbols since {since or 'listing'}...")
+        for symbol, frame in fetcher.download_actions(group, start=since).items():
+            known = {d for (d,) in conn.execute("SELECT date FROM actions WHERE ticker = ? AND split > 0", (symbol,))}
+            splits = {d.date().isoformat() for d in frame.index[frame["Stock Splits"] > 0]}
+            known_dividends = {d for (d,) in conn.execute("SELECT date FROM actions WHERE ticker = ? AND dividend > 0", (symbol,))}
+            if since is not None:
+                paid += [
+                    (symbol, day.date(), float(amount))
+                    for day, amount in frame.loc[frame["Dividends"] > 0, "Dividends"].items()
+                    if day.date().isoformat() not in known_dividends
+                ]
+            if since is not None and splits - known:
+                # Yahoo restates every earlier dividend on the post-split basis
+                restated.append(symbol)
+            else:
+                _store(conn, symbol, frame, now, replace=since is None)
+
+    if restated:
+        logging.info(f"✂️ New splits for {restated}; reloading their full action history")
+        for symbol, frame in fetcher.download_actions(restated).items():
+            _store(conn, symbol, frame, now, replace=True)
+    conn.commit()
+    return restated, paid
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Keep the Cached Bars on One Split Basis
+# ──────────────────────────────────────────────────────────────
+# Yahoo's Close is split-adjusted as of the download, so bars cached before a split are on the
+# old basis while bars fetched after it are not. Across the split the closes then jump by
+# the split ratio; such a (ticker, interval) is dropped and downloaded again in full.
+def _on_old_basis(conn, symbol, interval, split_date, ratio):
+    bars = conn.execute("""
+        SELECT date, close FROM bars
+        WHERE ticker = ? AND interval = ? AND date BETWEEN ? AND ? AND close > 0
+        ORDER BY date
+    """, (
+        symbol, interval,
+        (split_date - SPLIT_WINDOW).isoformat(), (split_date + SPLIT_WINDOW).isoformat()
+    )).fetchall()
+    bars = [(datetime.date.fromisoformat(day), close) for day, close in bars]
+    before = [close for day, close in bars if bar_cache.period_end(day, interval) <= split_date]
+    after = [close for day, close in bars if day >= split_date]
+    if not before or not after:
+        return False
+    jump = np.log(after[0] / before[-1])
+    return abs(jump + np.log(ratio)) < abs(jump)
+
+
+def repair_bars(conn, symbols):
+    splits = [
+        (ticker, datetime.date.fromisoformat(day), ratio)
+        for ticker, day, ratio in conn.execute(
+            f"SELECT ticker, date, split FROM actions WHERE split > 0 AND split != 1 "
+            f"AND ticker IN ({', '.join('?' for _ in symbols)})", list(symbols)
+        )
+    ]
+    intervals = {}
+    for ticker, interval in conn.execute("SELECT ticker, interval FROM bar_meta"):
+        intervals.setdefault(ticker, []).append(interval)
+
+    repaired = 0
+    for ticker, split_date, ratio in splits:
+        for interval in list(intervals.get(ticker, [])):
+            if _on_old_basis(conn, ticker, interval, split_date, ratio):
+                logging.warning(f"✂️ Cached {interval} bars of {ticker} predate its {split_date} split; re-fetching them")
+                bar_cache.invalidate(conn, ticker, interval)
+                intervals[ticker].remove(interval)
+                repaired += 1
+    conn.commit()
+    return repaired
+
+
+# The last bar that closed before the ex-date; a weekly or monthly bar containing it does not count
+def _last_closed_bar(conn, symbol, interval, ex_date):
+    bars = conn.execute("""
+        SELECT date, close FROM bars
+        WHERE ticker = ? AND interval = ? AND date < ? AND close > 0
+        ORDER BY date DESC
+    """, (symbol, interval, ex_date.isoformat()))
+    for day, close in bars:
+        day = datetime.date.fromisoformat(day)
+        if bar_cache.period_end(day, interval) <= ex_date:
+            return day, close
+    return None
+
+
+# Yahoo's Adj Close (auto_adjust=False) multiplies every bar that closed before an ex-date by
+# 1 - dividend / the last of those closes, so a new dividend leaves the cached adj_close stale by
+# exactly that factor and it is applied in place. Bars downloaded on or after the ex-date already
+# carry it, and the cache does not record which bars those are, so a (ticker, interval)
+# refreshed since then is downloaded again instead.
+def refresh_adj_close(conn, dividends):
+    rescaled = refetched = 0
+    for ticker, ex_date, amount in dividends:
+        cached = conn.execute("SELECT interval, fetched_at FROM bar_meta WHERE ticker = ?", (ticker,)).fetchall()
+        for interval, fetched_at in cached:
+            last = _last_closed_bar(conn, ticker, interval, ex_date)
+            if last is None:
+                continue
+            day, close = last
+            factor = 1 - amount / close
+            if datetime.datetime.fromisoformat(fetched_at).date() >= ex_date or not 0 < factor < 1:
+                bar_cache.invalidate(conn, ticker, interval)
+                refetched += 1
+                continue
+            conn.execute(
+                "UPDATE bars SET adj_close = adj_close * ? WHERE ticker = ? AND interval = ? AND date <= ?",
+                (factor, ticker, interval, day.isoformat())
+            )
+            rescaled += 1
+    if rescaled or refetched:
+        logging.info(
+            f"💰 New dividends for {sorted({t for t, _, _ in dividends})}: adj_close rescaled in "
+            f"{rescaled} cached series, {refetched} re-fetched"
+        )
+    conn.commit()
+    return rescaled + refetched
+
+
+def cached_actions(symbols, path=bar_cache.CACHE_PATH):
+    conn = connect(path)
+    try:
+        _, paid = refresh(conn, symbols)
+        repair_bars(conn, symbols)
+        refresh_adj_close(conn, paid)
+        # A ticker whose first download failed has no actions at all; ranking it would quietly
+        # fall back to price-only returns, so the caller retries instead
+        placeholders = ", ".join("?" for _ in symbols)
+        checked = {t for (t,) in conn.execute(f"SELECT ticker FROM actions_meta WHERE ticker IN ({placeholders})", list(symbols))}
+        missing = [s for s in symbols if s not in checked]
+        if missing:
+            raise RuntimeError(f"no corporate actions downloaded for {', '.join(missing)}")
+        return load(conn, symbols)
+    finally:
+        conn.close()
+
+# ──────────────────────────────────────────────────────────────
+# STEP 4: Adjustment Factors in One Cumulative-product Pass
+# ──────────────────────────────────────────────────────────────
+# g[t] = 1 + dividends with ex-date inside bar t / previous close. The growth of 1 invested
+# is cumprod(g): a bar's close is scaled by the product up to and including its own bar,
+# its open by the product up to the bar before, since the open precedes any ex-date in it.
+def dividend_growth(dates, symbols, closes, actions, mode=None):
+    growth = np.ones(closes.shape)
+    if (mode or RETURN_MODE) == "price" or actions is None or actions.empty:
+        return growth
+
+    dividends = actions[actions["dividend"] > 0]
+    cols = pd.Index(symbols).get_indexer(dividends["ticker"])
+    rows = dates.searchsorted(dividends["date"], side="right") - 1
+    keep = (cols >= 0) & (rows >= 0)
+    amounts = np.zeros(closes.shape)
+    np.add.at(amounts, (rows[keep], cols[keep]), dividends["dividend"].to_numpy()[keep])
+
+    previous = pd.DataFrame(closes).ffill().shift(1).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.where((amounts > 0) & (previous > 0), 1 + amounts / previous, 1.0)
+    return growth
+
+
+def adjust(dates, symbols, fields, actions, mode=None):
+    if (mode or RETURN_MODE) not in ("total", "price"):
+        raise ValueError(f"Unknown return mode: {mode or RETURN_MODE}")
+    growth = dividend_growth(dates, symbols, fields["Close"], actions, mode)
+    cumulative = np.cumprod(growth, axis=0)
+    return fields["Open"] * (cumulative / growth), fields["Close"] * cumulative
@@ -0,0 +1,160 @@
+import os
+import abc
+import time
+import atexit
+import logging
+import threading
+import contextlib
+
+import db_writer
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+# mysql -> pooled mysql.connector connections written through db_writer
+BACKEND = os.getenv("DB_BACKEND", "mysql")
+# The pool opens all of its connections up front; two cover the daily branch next to the history stages
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "2"))
+# How long a stage waits for a connection when every pooled one is borrowed
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Protocol compression pays off on the multi-row INSERT / LOAD DATA payloads to a remote host
+COMPRESS = os.getenv("DB_COMPRESS", "0") == "1"
+SSL_CA = os.getenv("DB_SSL_CA")
+AUTOCOMMIT = os.getenv("DB_AUTOCOMMIT", "0") == "1"
+# Commit every N rows inside a write; 0 keeps each stage's write in one transaction
+COMMIT_ROWS = int(os.getenv("DB_COMMIT_ROWS", "0"))
+HEALTH_CHECK_ATTEMPTS = int(os.getenv("DB_HEALTH_CHECK_ATTEMPTS", "3"))
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Backend Adapter Interface
+# ──────────────────────────────────────────────────────────────
+# A backend hands out connections with cursor()/commit()/rollback()/close() and bulk-writes
+# rows. A PostgreSQL backend would implement write_rows with COPY ... FROM STDIN and
+# INSERT ... ON CONFLICT, and be added with register_adapter("postgres", PostgresAdapter).
+class Adapter(abc.ABC):
+    @abc.abstractmethod
+    def connect(self, **config):
+        ...
+
+    @abc.abstractmethod
+    def write_rows(self, conn, table, columns, rows, update_columns=None):
+        ...
+
+    # Optional: release pooled connections
+    def close(self):
+        pass
+
+
+class MySQLAdapter(Adapter):
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size or POOL_SIZE
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, config):
+        from mysql.connector import pooling
+
+        key = tuple(sorted(config.items()))
+        with self._lock:
+            if key not in self._pools:
+                options = dict(config, compress=COMPRESS, autocommit=AUTOCOMMIT, **db_writer.connect_options())
+                if SSL_CA:
+                    options["ssl_ca"] = SSL_CA
+                self._pools[key] = pooling.MySQLConnectionPool(
+                    pool_name=f"refresh{len(self._pools)}",
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    **options
+                )
+                logging.info(f"🔌 Opened MySQL pool of {self.pool_size} to {config.get('host')}")
+            return self._pools[key]
+
+    def connect(self, **config):
+        from mysql.connector import errors
+
+        pool = self._pool(config)
+        deadline = time.monotonic() + POOL_TIMEOUT
+        while True:
+            try:
+                conn = pool.get_connection()
+                break
+            except errors.PoolError:
+                # Exhausted: wait for another stage to hand its connection back
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+        # Pooled connections can sit idle past wait_timeout; check before handing one out
+        conn.ping(reconnect=True, attempts=HEALTH_CHECK_ATTEMPTS, delay=1)
+        return conn
+
+    def write_rows(self, conn, table, columns, rows, update_columns=None):
+        return db_writer.write_rows(
+            conn, table, columns, rows, update_columns=update_columns, commit_every=COMMIT_ROWS
+        )
+
+    def close(self):
+        from mysql.connector import errors
+
+        with self._lock:
+            # The pool has no public close: check out every idle connection and disconnect it
+            # (close() on a pooled connection would only queue it again). Connections still
+            # borrowed by a session go back to a pool nobody uses any more.
+            for pool in self._pools.values():
+                while True:
+                    try:
+                        conn = pool.get_connection()
+                    except errors.PoolError:
+                        break
+                    except errors.Error:
+                        # A dead connection failed to reconnect and was queued again; taking it
+                        # once more would fail the same way, and it holds no open socket
+                        break
+                    conn.disconnect()
+            self._pools.clear()
+
+
+ADAPTERS = {"mysql": MySQLAdapter}
+_adapter = None
+
+
+def register_adapter(name, factory):
+    ADAPTERS[name] = factory
+
+
+def get_adapter():
+    global _adapter
+    if _adapter is None:
+        if BACKEND not in ADAPTERS:
+            raise ValueError(f"Unknown DB backend: {BACKEND}")
+        _adapter = ADAPTERS[BACKEND]()
+        # Disconnect the pooled connections when the process exits instead of dropping them
+        atexit.register(_adapter.close)
+    return _adapter
+
+
+def set_adapter(adapter):
+    global _adapter
+    previous, _adapter = _adapter, adapter
+    return previous
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Shared Session
+# ──────────────────────────────────────────────────────────────
+# Every stage borrows a connection from the same pool, so one process pays one handshake
+@contextlib.contextmanager
+def session(**config):
+    conn = get_adapter().connect(**config)
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Pooled connections go back to the pool instead of being closed
+        conn.close()
+
+
+def write_rows(conn, table, columns, rows, update_columns=None):
+    return get_adapter().write_rows(conn, table, columns, rows, update_columns=update_columns)
+
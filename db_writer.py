@@ -0,0 +1,136 @@
+import os
+import io
+import csv
+import time
+import logging
+import tempfile
+
+import metrics
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+# multirow  -> chunked INSERT ... VALUES (...), (...), ...
+# load_data -> LOAD DATA LOCAL INFILE from a CSV buffer
+# prepared  -> server-side prepared INSERT executed per chunk
+WRITE_STRATEGY = os.getenv("DB_WRITE_STRATEGY", "multirow")
+BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "1000"))
+
+
+def connect_options(strategy=None):
+    # LOCAL INFILE has to be enabled on the client when the connection is opened
+    if (strategy or WRITE_STRATEGY) == "load_data":
+        return {"allow_local_infile": True}
+    return {}
+
+
+def _on_duplicate(update_columns):
+    if not update_columns:
+        return ""
+    assignments = ", ".join(f"{c} = VALUES({c})" for c in update_columns)
+    return f" ON DUPLICATE KEY UPDATE {assignments}"
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+# ──────────────────────────────────────────────────────────────
+# STRATEGY: Multi-row INSERT
+# ──────────────────────────────────────────────────────────────
+def _write_multirow(cursor, table, columns, chunk, update_columns):
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        + ", ".join([placeholders] * len(chunk))
+        + _on_duplicate(update_columns)
+    )
+    cursor.execute(sql, [value for row in chunk for value in row])
+
+# ──────────────────────────────────────────────────────────────
+# STRATEGY: LOAD DATA LOCAL INFILE
+# ──────────────────────────────────────────────────────────────
+def _csv_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\")
+    return str(value)
+
+
+def _write_load_data(cursor, table, columns, chunk, update_columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in chunk:
+        writer.writerow([_csv_value(v) for v in row])
+
+    # mysql.connector streams LOCAL INFILE from a path, so the buffer is spilled to a temp file
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8", delete=False) as handle:
+        handle.write(buffer.getvalue())
+        path = handle.name
+    # LOAD DATA has no ON DUPLICATE KEY UPDATE; REPLACE swaps in the new row instead
+    duplicates = "REPLACE" if update_columns else ""
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s {duplicates} INTO TABLE {table}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            ({', '.join(columns)})
+        """, (path,))
+    finally:
+        os.remove(path)
+
+# ──────────────────────────────────────────────────────────────
+# STRATEGY: Server-side Prepared Statement
+# ──────────────────────────────────────────────────────────────
+def _write_prepared(cursor, table, columns, chunk, update_columns):
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        + _on_duplicate(update_columns)
+    )
+    cursor.executemany(sql, chunk)
+
+# ──────────────────────────────────────────────────────────────
+# PUBLIC: Write Rows in Batches
+# ──────────────────────────────────────────────────────────────
+_WRITERS = {
+    "multirow": _write_multirow,
+    "load_data": _write_load_data,
+    "prepared": _write_prepared,
+}
+
+
+# update_columns turns the insert into an upsert on the table's unique key
+# commit_every commits after every that many rows instead of leaving it to the caller
+def write_rows(conn, table, columns, rows, strategy=None, batch_size=None, update_columns=None,
+               commit_every=0):
+    strategy = strategy or WRITE_STRATEGY
+    batch_size = batch_size or BATCH_SIZE
+    if strategy not in _WRITERS:
+        raise ValueError(f"Unknown write strategy: {strategy}")
+
+    rows = [tuple(row) for row in rows]
+    if not rows:
+        return 0
+
+    started = time.perf_counter()
+    cursor = conn.cursor(prepared=True) if strategy == "prepared" else conn.cursor()
+    try:
+        uncommitted = 0
+        for chunk in _chunks(rows, batch_size):
+            _WRITERS[strategy](cursor, table, columns, chunk, update_columns)
+            uncommitted += len(chunk)
+            if commit_every and uncommitted >= commit_every:
+                conn.commit()
+                uncommitted = 0
+    finally:
+        cursor.close()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    metrics.add_db_rows(len(rows), elapsed)
+    logging.info(
+        f"💾 Wrote {len(rows)} rows to {table} via {strategy} "
+        f"in {elapsed:.2f}s ({len(rows) / elapsed:,.0f} rows/s)"
+    )
+    return len(rows)
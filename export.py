@@ -0,0 +1,116 @@
+import os
+import json
+import datetime
+import logging
+
+import pandas as pd
+
+import columnar
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+ENABLED = os.getenv("EXPORT_PARQUET", "0") == "1"
+EXPORT_DIR = os.getenv("EXPORT_DIR", "export")
+COMPRESSION = os.getenv("EXPORT_COMPRESSION", "zstd")
+# Bar files for years before this many years ago are final once written
+REWRITE_YEARS = int(os.getenv("EXPORT_REWRITE_YEARS", "2"))
+
+BAR_COLUMNS = {
+    "Open": "open", "High": "high", "Low": "low", "Close": "close",
+    "Adj Close": "adj_close", "Volume": "volume",
+}
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Hive-partitioned Parquet Writer
+# ──────────────────────────────────────────────────────────────
+# Needs pyarrow; imported here so the MySQL-only path does not depend on it
+def _write(frame, dataset, partition_by, basename="part-{i}.parquet", replace=True):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    partitioning = ds.partitioning(
+        pa.schema([table.schema.field(name) for name in partition_by]), flavor="hive"
+    )
+    # Dictionary pages for the repetitive string columns; min/max statistics per row group
+    # let readers skip files and row groups on date/price filters
+    options = ds.ParquetFileFormat().make_write_options(
+        compression=COMPRESSION, use_dictionary=True, write_statistics=True
+    )
+    ds.write_dataset(
+        table,
+        os.path.join(EXPORT_DIR, dataset),
+        format="parquet",
+        partitioning=partitioning,
+        file_options=options,
+        basename_template=basename,
+        # replace -> each written partition is rewritten whole; otherwise files are added alongside
+        existing_data_behavior="delete_matching" if replace else "overwrite_or_ignore",
+    )
+    logging.info(f"🗄️ Exported {len(frame)} rows to {os.path.join(EXPORT_DIR, dataset)}")
+    return len(frame)
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Raw Bars, Partitioned by Year and Ticker
+# ──────────────────────────────────────────────────────────────
+def _exported_tickers(dataset):
+    path = os.path.join(EXPORT_DIR, dataset, "_tickers.json")
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return set(json.load(f))
+
+
+def export_bars(data, symbols, interval):
+    dataset = f"bars_{interval}"
+    long = columnar.to_long(data, symbols).reset_index()
+    frame = pd.DataFrame({
+        "ticker": long["ticker"].cat.rename_categories(lambda s: s.replace(".NS", "")).astype(str),
+        "date": long["Date"].dt.date,
+        "year": long["Date"].dt.year.astype("int16"),
+    })
+    for field, column in BAR_COLUMNS.items():
+        frame[column] = long[field].array
+
+    # Only recent years can still change; tickers new to the export get their full history
+    known = _exported_tickers(dataset)
+    recent = frame["year"] >= datetime.date.today().year - REWRITE_YEARS + 1
+    frame = frame[recent | ~frame["ticker"].isin(known)]
+    if frame.empty:
+        return 0
+
+    written = _write(frame, dataset, ["year", "ticker"])
+    with open(os.path.join(EXPORT_DIR, dataset, "_tickers.json"), "w", encoding="utf-8") as f:
+        json.dump(sorted(known | set(frame["ticker"])), f)
+    return written
+
+
+def export_stock_data(records, columns):
+    frame = pd.DataFrame(records, columns=columns)
+    frame["date"] = pd.to_datetime(frame["date"]).dt.date
+    frame["year"] = pd.to_datetime(frame["date"]).dt.year.astype("int16")
+    written = 0
+    # One file per session in each (year, ticker) partition: re-exporting a day replaces only it
+    for date, group in frame.groupby("date"):
+        written += _write(group, "stock_data", ["year", "ticker"], basename=f"{date}-{{i}}.parquet", replace=False)
+    return written
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Derived Winner Tables
+# ──────────────────────────────────────────────────────────────
+# A few hundred rows in total, so these are partitioned by year only; the ticker / company
+# column is dictionary-encoded inside each file instead of splitting into one-row files
+def export_monthly_winners(winners):
+    frame = pd.DataFrame(winners).rename(columns={"symbol": "ticker"})
+    frame["ticker"] = frame["ticker"].astype("category")
+    frame["gain_pct"] = frame["gain_pct"].astype("float64")
+    frame["year"] = pd.to_datetime(frame["date"]).dt.year.astype("int16")
+    return _write(frame, "monthly_winners", ["year"])
+
+
+def export_yearly_top_performers(top_performers):
+    frame = pd.DataFrame(top_performers, columns=["year", "year_rank", "company", "return_pct"])
+    frame["company"] = frame["company"].astype("category")
+    frame["year"] = frame["year"].astype("int16")
+    return _write(frame, "yearly_top_performers", ["year"])
@@ -0,0 +1,121 @@
+import re
+import time
+import contextlib
+
+import mysql.connector
+
+import db
+
+# ──────────────────────────────────────────────────────────────
+# In-memory stand-in for mysql.connector connections
+# ──────────────────────────────────────────────────────────────
+# Accepts the statements the pipeline issues, counts rows and round trips and can
+# add a fixed latency per round trip to model a remote Cloud SQL instance.
+
+_INSERT = re.compile(r"^\s*INSERT\s+INTO\s+(\w+)", re.IGNORECASE)
+_LOAD = re.compile(r"LOAD\s+DATA\s+LOCAL\s+INFILE.*INTO\s+TABLE\s+(\w+)", re.IGNORECASE | re.DOTALL)
+
+
+class FakeCursor:
+    def __init__(self, conn, prepared=False):
+        self.conn = conn
+        self.prepared = prepared
+        self.rowcount = 0
+        self._rows = []
+
+    def _round_trip(self):
+        self.conn.round_trips += 1
+        if self.conn.latency:
+            time.sleep(self.conn.latency)
+
+    def execute(self, sql, params=None):
+        self._round_trip()
+        self.conn.statements.append(sql)
+        self._rows = []
+
+        insert = _INSERT.match(sql)
+        load = _LOAD.search(sql)
+        if insert:
+            self.rowcount = sql.count("(%s")
+            self.conn.add_rows(insert.group(1), self.rowcount)
+        elif load:
+            with open(params[0], encoding="utf-8") as f:
+                self.rowcount = sum(1 for _ in f)
+            self.conn.add_rows(load.group(1), self.rowcount)
+        elif re.match(r"^\s*SELECT\s+(MAX|MIN)\(", sql, re.IGNORECASE):
+            self._rows = [(None,)]
+        elif re.match(r"^\s*SELECT\s+COUNT\(", sql, re.IGNORECASE):
+            self._rows = [(0,)]
+
+    def executemany(self, sql, seq_params):
+        seq_params = list(seq_params)
+        # Prepared statements execute once per row; the text protocol batches the INSERT
+        for _ in range(len(seq_params) if self.prepared else 1):
+            self._round_trip()
+        self.conn.statements.append(sql)
+        self.rowcount = len(seq_params)
+        insert = _INSERT.match(sql)
+        if insert:
+            self.conn.add_rows(insert.group(1), self.rowcount)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.statements = []
+        self.rows = {}
+        self.commits = 0
+
+    def add_rows(self, table, n):
+        self.rows[table] = self.rows.get(table, 0) + n
+
+    def cursor(self, prepared=False, **kwargs):
+        return FakeCursor(self, prepared)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeAdapter(db.MySQLAdapter):
+    def __init__(self, conn):
+        super().__init__()
+        self.conn = conn
+
+    def connect(self, **config):
+        return self.conn
+
+
+@contextlib.contextmanager
+def patched_connect(conn):
+    # Stages borrow connections from db.session; the schema CLI still calls mysql.connector.connect
+    original = mysql.connector.connect
+    mysql.connector.connect = lambda *args, **kwargs: conn
+    previous = db.set_adapter(FakeAdapter(conn))
+    try:
+        yield conn
+    finally:
+        mysql.connector.connect = original
+        db.set_adapter(previous)
@@ -0,0 +1,180 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import metrics
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+CHUNK_SIZE = int(os.getenv("FETCH_CHUNK_SIZE", "10"))
+MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "4"))
+MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", "4"))
+BACKOFF_SECONDS = float(os.getenv("FETCH_BACKOFF_SECONDS", "1"))
+RATE_PER_SECOND = float(os.getenv("FETCH_RATE_PER_SECOND", "4"))
+BURST = int(os.getenv("FETCH_BURST", "8"))
+
+FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+ACTION_FIELDS = ["Dividends", "Stock Splits"]
+INTRADAY_INTERVALS = {"1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"}
+
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Token-bucket Rate Limit
+# ──────────────────────────────────────────────────────────────
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_bucket = None
+_bucket_lock = threading.Lock()
+
+
+# One bucket per process: overlapping downloads (streamed chunks, concurrent stages, backfill
+# partitions) share the request budget instead of each getting a full one. Rebuilt when the
+# rate is changed, as runner.py does for its worker processes.
+def shared_bucket():
+    global _bucket
+    with _bucket_lock:
+        if _bucket is None or (_bucket.rate, _bucket.capacity) != (RATE_PER_SECOND, BURST):
+            _bucket = TokenBucket(RATE_PER_SECOND, BURST)
+        return _bucket
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Fetch One Chunk with Retry, Backoff and Jitter
+# ──────────────────────────────────────────────────────────────
+# yfinance pulls in requests, curl_cffi and its own scrapers; load it on the first fetch only
+def _yfinance():
+    import yfinance
+    return yfinance
+
+
+def _no_data_errors():
+    from yfinance.exceptions import YFPricesMissingError, YFTzMissingError
+    # Yahoo has no bars for the range (or the symbol is delisted): retrying will not help
+    return (YFPricesMissingError, YFTzMissingError)
+
+
+def _fetch_one(symbol, bucket, options):
+    bucket.acquire()
+    frame = _yfinance().Ticker(symbol).history(
+        auto_adjust=False, actions=False, raise_errors=True, **options
+    )
+    # Match yf.download: daily-and-above bars come back without a timezone
+    if frame.index.tz is not None and options.get("interval") not in INTRADAY_INTERVALS:
+        frame.index = frame.index.tz_localize(None)
+    frame.index.name = "Date"
+    frame = frame.reindex(columns=FIELDS)
+    # yfinance does not expose response sizes, so the decoded bars are counted instead
+    metrics.add_bytes(frame.memory_usage(deep=True).sum())
+    return frame
+
+
+# Daily history with the dividend / split columns, reduced to the days that have an action
+def _fetch_actions(symbol, bucket, options):
+    bucket.acquire()
+    frame = _yfinance().Ticker(symbol).history(
+        interval="1d", auto_adjust=False, actions=True, raise_errors=True, **options
+    )
+    if frame.index.tz is not None:
+        frame.index = frame.index.tz_localize(None)
+    frame.index.name = "Date"
+    frame = frame.reindex(columns=ACTION_FIELDS).fillna(0)
+    return frame[(frame != 0).any(axis=1)]
+
+
+def _fetch_chunk(chunk, bucket, options, fetch_one=_fetch_one):
+    frames = {}
+    pending = list(chunk)
+    no_data_errors = _no_data_errors()
+
+    for attempt in range(MAX_RETRIES + 1):
+        failed = []
+        for symbol in pending:
+            try:
+                frames[symbol] = fetch_one(symbol, bucket, options)
+            except no_data_errors as e:
+                logging.warning(f"⚠️ No data for {symbol}: {e}")
+            except Exception as e:
+                logging.warning(f"⚠️ Attempt {attempt + 1} failed for {symbol}: {e}")
+                failed.append(symbol)
+
+        pending = failed
+        if not pending or attempt == MAX_RETRIES:
+            break
+        delay = BACKOFF_SECONDS * 2 ** attempt + random.uniform(0, BACKOFF_SECONDS)
+        logging.info(f"🔁 Retrying {len(pending)} symbols in {delay:.1f}s...")
+        time.sleep(delay)
+
+    if pending:
+        logging.error(f"❌ Gave up on {pending} after {MAX_RETRIES + 1} attempts")
+    return frames
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Fan Chunks Out Over a Bounded Thread Pool
+# ──────────────────────────────────────────────────────────────
+def download(symbols, start=None, end=None, period=None, interval="1d",
+             chunk_size=None, max_workers=None):
+    symbols = list(symbols)
+    chunk_size = chunk_size or CHUNK_SIZE
+    options = {"interval": interval}
+    for name, value in (("start", start), ("end", end), ("period", period)):
+        if value is not None:
+            options[name] = value
+
+    bucket = shared_bucket()
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    frames = {}
+    with ThreadPoolExecutor(max_workers=max_workers or MAX_WORKERS) as pool:
+        futures = [pool.submit(metrics.bind(_fetch_chunk), chunk, bucket, options) for chunk in chunks]
+        for future in as_completed(futures):
+            frames.update(future.result())
+
+    if not frames:
+        return None
+
+    # Same shape as yf.download(group_by="ticker"); failed symbols keep all-NaN columns
+    data = pd.concat({s: frames[s] for s in symbols if s in frames}, axis=1).sort_index()
+    data = data.reindex(columns=pd.MultiIndex.from_product([symbols, FIELDS]))
+    logging.info(f"✅ Downloaded {interval} bars for {len(frames)}/{len(symbols)} symbols")
+    return data
+
+
+# Dividends and splits per symbol since start (or the full history); symbols that failed are left out
+def download_actions(symbols, start=None, chunk_size=None, max_workers=None):
+    symbols = list(symbols)
+    chunk_size = chunk_size or CHUNK_SIZE
+    options = {"start": start} if start is not None else {"period": "max"}
+
+    bucket = shared_bucket()
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    frames = {}
+    with ThreadPoolExecutor(max_workers=max_workers or MAX_WORKERS) as pool:
+        futures = [pool.submit(metrics.bind(_fetch_chunk), chunk, bucket, options, _fetch_actions) for chunk in chunks]
+        for future in as_completed(futures):
+            frames.update(future.result())
+
+    logging.info(f"✅ Downloaded corporate actions for {len(frames)}/{len(symbols)} symbols")
+    return frames
@@ -0,0 +1,143 @@
+import os
+import time
+import argparse
+import datetime
+import logging
+from zoneinfo import ZoneInfo
+
+import mysql.connector
+
+import db
+import fetcher
+import metrics
+import schema
+import script3
+import universe
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+TABLE = "stock_data"
+MARKET_TZ = ZoneInfo("Asia/Kolkata")
+MARKET_OPEN = datetime.time(9, 15)
+MARKET_CLOSE = datetime.time(15, 30)
+# NSE publishes the closing price a few minutes after 15:30; finalise once it has settled
+FINALISE_DELAY = datetime.timedelta(minutes=int(os.getenv("INTRADAY_FINALISE_DELAY_MINUTES", "20")))
+
+POLL_SECONDS = float(os.getenv("INTRADAY_POLL_SECONDS", "60"))
+# Changed quotes are coalesced per (ticker, date) and written at most this often
+FLUSH_SECONDS = float(os.getenv("INTRADAY_FLUSH_SECONDS", "300"))
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Market Clock
+# ──────────────────────────────────────────────────────────────
+def now():
+    return datetime.datetime.now(MARKET_TZ)
+
+
+def session_bounds(moment):
+    day = moment.date()
+    opens = datetime.datetime.combine(day, MARKET_OPEN, MARKET_TZ)
+    finalise = datetime.datetime.combine(day, MARKET_CLOSE, MARKET_TZ) + FINALISE_DELAY
+    return opens, finalise
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Poll Quotes and Keep Only Changed Rows
+# ──────────────────────────────────────────────────────────────
+def poll(symbols):
+    # The in-progress daily bar: today's open, running high/low, last price and volume
+    data = fetcher.download(symbols, period="1d", interval="1d")
+    if data is None:
+        return []
+    return script3.build_daily_records(data, symbols)
+
+
+def _values(record):
+    # Compare at the precision MySQL stores (DECIMAL(14,4) for every price); inserted_at is not data
+    ticker, date, o, h, l, c, a, v, _ = record
+    return (round(o, 4), round(h, 4), round(l, 4), round(c, 4), round(a, 4), v)
+
+
+def changed_rows(records, written):
+    return {
+        (r[0], r[1]): r for r in records
+        if written.get((r[0], r[1])) != _values(r)
+    }
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Micro-batch Upserts
+# ──────────────────────────────────────────────────────────────
+def flush(conn, pending, written, stage_name="intraday_flush"):
+    if not pending:
+        return
+    rows = list(pending.values())
+    with metrics.stage(stage_name, rows_in=len(rows)):
+        # The session outlives MySQL's wait_timeout between flushes
+        conn.ping(reconnect=True, attempts=3, delay=5)
+        db.write_rows(conn, TABLE, script3.COLUMNS, rows, update_columns=schema.update_columns(TABLE))
+        conn.commit()
+    for key, record in pending.items():
+        written[key] = _values(record)
+    pending.clear()
+
+
+def run(symbols, poll_seconds=POLL_SECONDS, flush_seconds=FLUSH_SECONDS, clock=now, sleep=time.sleep):
+    today = clock()
+    if today.weekday() >= 5:
+        logging.info("📅 Weekend: no NSE session today.")
+        return True
+    opens, finalise = session_bounds(today)
+
+    config = dict(host=script3.DB_HOST, user=script3.DB_USER, password=script3.DB_PASS, database=script3.DB_NAME)
+    with db.session(**config) as conn:
+        cursor = conn.cursor()
+        # Intraday rows are always upserted in place; a shadow-table swap would hide them until close
+        schema.prepare_table(cursor, TABLE, mode="upsert")
+        cursor.close()
+
+        written = {}
+        pending = {}
+        last_flush = clock()
+        while clock() < finalise:
+            if clock() < opens:
+                wait = (opens - clock()).total_seconds()
+                logging.info(f"⏳ Market opens at {MARKET_OPEN}; waiting {wait / 60:.0f} min")
+                sleep(min(wait, 15 * 60))
+                continue
+
+            pending.update(changed_rows(poll(symbols), written))
+            if pending and (clock() - last_flush).total_seconds() >= flush_seconds:
+                logging.info(f"💾 Upserting {len(pending)} changed rows")
+                try:
+                    flush(conn, pending, written)
+                except mysql.connector.Error as e:
+                    # Rows stay pending and go out with the next micro-batch
+                    logging.error(f"❌ MySQL Error: {e}")
+                last_flush = clock()
+            sleep(poll_seconds)
+
+        # End of day: write the settled closing bar of every symbol, changed or not
+        pending.update({(r[0], r[1]): r for r in poll(symbols)})
+        flush(conn, pending, written, stage_name="intraday_finalise")
+    logging.info(f"✅ Finalised {len(written)} rows for the {opens.date()} session.")
+    return True
+
+# ──────────────────────────────────────────────────────────────
+# MAIN
+# ──────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll Nifty quotes during market hours and upsert changed rows")
+    parser.add_argument("--index", default="nifty50")
+    parser.add_argument("--poll-seconds", type=float, default=POLL_SECONDS)
+    parser.add_argument("--flush-seconds", type=float, default=FLUSH_SECONDS)
+    args = parser.parse_args()
+
+    symbols = universe.get_symbols(args.index)
+    if not symbols:
+        logging.error("❌ No symbols fetched. Exiting.")
+        exit(1)
+
+    ok = run(symbols, args.poll_seconds, args.flush_seconds)
+    metrics.write_prometheus()
+    if not ok:
+        exit(1)
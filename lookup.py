@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import sqlite3
+import decimal
+import datetime
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+
+import db
+import schema
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+DB_HOST = os.getenv("DB_HOST")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+
+# Entries kept in memory per process
+LRU_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "4096"))
+# Shared by every process on the host; empty disables it
+CACHE_PATH = os.getenv("LOOKUP_CACHE_PATH", os.path.join(".cache", "lookup.sqlite"))
+# How long a generation read from MySQL is trusted. The tables change once a day, so this
+# bounds how stale a read can be after a refresh, and is the only MySQL query on hot reads.
+GENERATION_TTL = float(os.getenv("LOOKUP_GENERATION_TTL_SECONDS", "60"))
+
+YEARLY_TABLE = "yearly_top_performers"
+MONTHLY_TABLE = "monthly_winners"
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: In-process LRU
+# ──────────────────────────────────────────────────────────────
+class LRU:
+    def __init__(self, size=LRU_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Shared Cache File
+# ──────────────────────────────────────────────────────────────
+def connect(path=CACHE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            table_name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            generation INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (table_name, key)
+        ) WITHOUT ROWID;
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS generations (
+            table_name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL,
+            checked_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    """)
+    return conn
+
+
+# Values are cached as JSON, so every path returns the same types: DECIMAL -> float, DATE -> ISO string
+def _encode(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot cache {type(value).__name__}")
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Generation-checked Reads
+# ──────────────────────────────────────────────────────────────
+# Lookup order: memory, then the shared file, then MySQL. Entries are keyed by the table's
+# refresh generation, so a refresh never has to find and delete them: once the bumped
+# generation is seen, old entries simply stop matching and age out.
+class ResultsCache:
+    def __init__(self, path=CACHE_PATH, size=LRU_SIZE, ttl=GENERATION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.memory = LRU(size)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _session(self):
+        return db.session(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME)
+
+    def _query_generation(self, table):
+        with self._session() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT generation FROM {schema.GENERATIONS_TABLE} WHERE table_name = %s;", (table,))
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows[0][0] if rows else 0
+
+    def generation(self, table):
+        now = time.time()
+        with self._lock:
+            known = self._generations.get(table)
+        if known and now - known[1] < self.ttl:
+            return known[0]
+
+        shared = None
+        if self.path:
+            conn = connect(self.path)
+            try:
+                shared = conn.execute(
+                    "SELECT generation, checked_at FROM generations WHERE table_name = ?", (table,)
+                ).fetchone()
+            finally:
+                conn.close()
+        if shared and now - shared[1] < self.ttl:
+            # Another process on this host checked recently
+            generation, checked_at = shared
+        else:
+            try:
+                generation, checked_at = self._query_generation(table), now
+            except Exception as e:
+                # MySQL unreachable: keep serving what the last known generation cached
+                fallback = known or shared
+                if fallback is None:
+                    raise
+                logging.warning(f"⚠️ Could not check the {table} generation ({e}); serving generation {fallback[0]}")
+                generation, checked_at = fallback[0], now
+            else:
+                self._save_generation(table, generation, checked_at)
+        with self._lock:
+            self._generations[table] = (generation, checked_at)
+        return generation
+
+    def _save_generation(self, table, generation, checked_at):
+        if not self.path:
+            return
+        conn = connect(self.path)
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO generations (table_name, generation, checked_at) VALUES (?, ?, ?)",
+                (table, generation, checked_at)
+            )
+            conn.execute("DELETE FROM results WHERE table_name = ? AND generation != ?", (table, generation))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, table, key, sql, params):
+        # Table names are formatted into the SQL; only the pipeline's own tables are accepted
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        schema.base_table(table)
+        generation = self.generation(table)
+        cache_key = (table, key, generation)
+        missing = object()
+        value = self.memory.get(cache_key, missing)
+        if value is not missing:
+            return value
+
+        text = None
+        if self.path:
+            conn = connect(self.path)
+            try:
+                row = conn.execute(
+                    "SELECT value FROM results WHERE table_name = ? AND key = ? AND generation = ?",
+                    (table, key, generation)
+                ).fetchone()
+            finally:
+                conn.close()
+            text = row[0] if row else None
+
+        if text is None:
+            with self._session() as db_conn:
+                cursor = db_conn.cursor()
+                cursor.execute(sql, params)
+                columns = [d[0] for d in cursor.description]
+                rows = [dict(zip(columns, r)) for r in cursor.fetchall()]
+                cursor.close()
+            text = json.dumps(rows, default=_encode)
+            if self.path:
+                conn = connect(self.path)
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO results (table_name, key, generation, value) VALUES (?, ?, ?, ?)",
+                        (table, key, generation, text)
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+
+        value = json.loads(text)
+        self.memory.put(cache_key, value)
+        return value
+
+    # The lookups return plain dicts shared through the cache; callers must not mutate them
+    def top_performers(self, year, table=YEARLY_TABLE):
+        return self.get(
+            table, f"year:{year}",
+            f"SELECT year, year_rank, company, return_pct FROM {table} WHERE year = %s ORDER BY year_rank;",
+            (year,)
+        )
+
+    def best_in_year(self, year, table=YEARLY_TABLE):
+        ranked = self.top_performers(year, table)
+        return ranked[0] if ranked else None
+
+    def monthly_winners(self, year, table=MONTHLY_TABLE):
+        return self.get(
+            table, f"year:{year}",
+            f"SELECT ticker, date, open, high, low, close, adj_close, volume FROM {table} "
+            f"WHERE date BETWEEN %s AND %s ORDER BY date;",
+            (datetime.date(year, 1, 1), datetime.date(year, 12, 31))
+        )
+
+    def monthly_winner(self, year, month, table=MONTHLY_TABLE):
+        # Served from the cached year, so twelve months cost one query
+        prefix = f"{year:04d}-{month:02d}"
+        return next((w for w in self.monthly_winners(year, table) if w["date"].startswith(prefix)), None)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ResultsCache()
+        return _default
+
+
+def best_in_year(year, table=YEARLY_TABLE):
+    return default_cache().best_in_year(year, table)
+
+
+def top_performers(year, table=YEARLY_TABLE):
+    return default_cache().top_performers(year, table)
+
+
+def monthly_winner(year, month, table=MONTHLY_TABLE):
+    return default_cache().monthly_winner(year, month, table)
+
+# ──────────────────────────────────────────────────────────────
+# MAIN: python lookup.py year 2023 | month 2024-03
+# ──────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Look up yearly top performers and monthly winners")
+    parser.add_argument("kind", choices=["year", "month"])
+    parser.add_argument("when", help="YYYY for year, YYYY-MM for month")
+    args = parser.parse_args()
+
+    if args.kind == "year":
+        result = best_in_year(int(args.when))
+    else:
+        year, month = args.when.split("-")
+        result = monthly_winner(int(year), int(month))
+    print(json.dumps(result, indent=1))
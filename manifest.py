@@ -0,0 +1,101 @@
+import os
+import json
+import pickle
+import shutil
+import datetime
+import logging
+import threading
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+RUNS_DIR = os.getenv("MANIFEST_DIR", os.path.join(".cache", "runs"))
+# RESUME=0 ignores (and overwrites) the checkpoints of an earlier attempt
+RESUME = os.getenv("RESUME", "1") != "0"
+KEEP_DAYS = int(os.getenv("MANIFEST_KEEP_DAYS", "7"))
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Run Manifest
+# ──────────────────────────────────────────────────────────────
+def run_key(universe, day=None):
+    return f"{universe}-{day or datetime.date.today()}"
+
+
+# One manifest per run key (universe + day), so a failed scheduled run and its manual
+# retry share checkpoints. Each completed stage records when it finished, how many rows
+# it produced and, optionally, a pickled artifact the retry can pick up instead of redoing it.
+class Manifest:
+    def __init__(self, key, directory=RUNS_DIR, resume=RESUME):
+        self.key = key
+        self.path = os.path.join(directory, f"{key}.json")
+        self.artifact_dir = os.path.join(directory, key)
+        self.stages = {}
+        # The daily branch completes its stages from its own thread while the history branch runs
+        self._lock = threading.Lock()
+        if resume and os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.stages = json.load(f)["stages"]
+            if self.stages:
+                logging.info(f"♻️ Resuming run {key}: {', '.join(self.stages)} already done")
+        elif os.path.isdir(self.artifact_dir):
+            shutil.rmtree(self.artifact_dir)
+
+    def done(self, stage):
+        return stage in self.stages
+
+    def artifact(self, stage):
+        entry = self.stages.get(stage)
+        if not entry or not entry.get("artifact"):
+            return None
+        try:
+            with open(entry["artifact"], "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logging.warning(f"⚠️ Checkpoint for {stage} unreadable ({e}); redoing the stage")
+            del self.stages[stage]
+            return None
+
+    def complete(self, stage, artifact=None, rows=None):
+        entry = {"finished_at": datetime.datetime.now().isoformat(timespec="seconds"), "rows": rows}
+        if artifact is not None:
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            path = os.path.join(self.artifact_dir, f"{stage}.pkl")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            entry["artifact"] = path
+        with self._lock:
+            self.stages[stage] = entry
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # A crash mid-write must not leave a manifest that claims more than was done
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": self.key, "stages": self.stages}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+# Completed stages of a run without opening it: reads the manifest only, so nothing is discarded
+def peek(key, directory=RUNS_DIR):
+    path = os.path.join(directory, f"{key}.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["stages"]
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Housekeeping
+# ──────────────────────────────────────────────────────────────
+def prune(directory=RUNS_DIR, keep_days=KEEP_DAYS):
+    if not os.path.isdir(directory):
+        return
+    cutoff = datetime.datetime.now().timestamp() - keep_days * 86400
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.getmtime(path) < cutoff:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import functools
+import logging
+import datetime
+import threading
+import contextvars
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+# One JSON object per stage is appended here
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(".cache", "metrics.jsonl"))
+# Optional node_exporter textfile-collector output, e.g. /var/lib/node_exporter/pipeline.prom
+PROMETHEUS_TEXTFILE = os.getenv("METRICS_PROMETHEUS_TEXTFILE")
+RUN_ID = os.getenv("GITHUB_RUN_ID") or datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+
+_lock = threading.Lock()
+_active = []
+_completed = []
+# The innermost stage of the current thread (or of the thread that bound the running task)
+_current = contextvars.ContextVar("stage", default=None)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Stage Timer
+# ──────────────────────────────────────────────────────────────
+class Stage:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_downloaded = 0
+        self.db_rows = 0
+        self.db_seconds = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        with _lock:
+            _active.append(self)
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.started
+        _current.reset(self._token)
+        with _lock:
+            _active.remove(self)
+        record = {
+            "run_id": RUN_ID,
+            "stage": self.name,
+            "status": "error" if exc_type else "ok",
+            "wall_seconds": round(wall, 4),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_downloaded": self.bytes_downloaded,
+            "db_rows": self.db_rows,
+            "db_rows_per_second": round(self.db_rows / self.db_seconds, 1) if self.db_seconds else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "finished_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        _emit(record)
+        return False
+
+
+def stage(name, rows_in=None):
+    return Stage(name, rows_in)
+
+
+# fn wrapped to run in the caller's context, for pool submits: counters reported from the worker
+# thread then land on the caller's stage rather than on whichever stage another thread opened last
+def bind(fn):
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        # A context can be entered by one thread at a time; each call gets its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return bound
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Counters Reported From Inside a Stage
+# ──────────────────────────────────────────────────────────────
+def _innermost():
+    return _current.get() or (_active[-1] if _active else None)
+
+
+def add_bytes(n):
+    with _lock:
+        current = _innermost()
+        if current is not None:
+            current.bytes_downloaded += int(n)
+
+
+def add_db_rows(rows, seconds):
+    with _lock:
+        current = _innermost()
+        if current is not None:
+            current.db_rows += rows
+            current.db_seconds += seconds
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: JSON Lines and Prometheus Output
+# ──────────────────────────────────────────────────────────────
+def _emit(record):
+    line = json.dumps(record)
+    logging.info(f"📈 {line}")
+    with _lock:
+        _completed.append(record)
+    if METRICS_PATH:
+        directory = os.path.dirname(METRICS_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def write_prometheus(path=None):
+    path = path or PROMETHEUS_TEXTFILE
+    if not path or not _completed:
+        return
+
+    gauges = {
+        "wall_seconds": "Wall-clock time of the stage",
+        "rows_in": "Rows entering the stage",
+        "rows_out": "Rows produced by the stage",
+        "bytes_downloaded": "Bytes downloaded during the stage",
+        "db_rows_per_second": "Database write throughput",
+        "peak_rss_mb": "Peak resident set size of the process at the end of the stage",
+    }
+    # Gauges: a stage recorded several times (intraday_flush, per-chunk stages) keeps its latest
+    # record only, since series with identical labels make the textfile collector reject the file
+    with _lock:
+        latest = {record["stage"]: record for record in _completed}
+    lines = []
+    for field, help_text in gauges.items():
+        metric = f"pipeline_stage_{field}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for record in latest.values():
+            if record[field] is not None:
+                lines.append(f'{metric}{{stage="{record["stage"]}"}} {record[field]}')
+    lines.append("# HELP pipeline_last_run_timestamp_seconds Unix time the pipeline last finished")
+    lines.append("# TYPE pipeline_last_run_timestamp_seconds gauge")
+    lines.append(f"pipeline_last_run_timestamp_seconds {time.time():.0f}")
+
+    # Textfile collectors may read at any moment, so swap the file in atomically
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
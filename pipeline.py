@@ -0,0 +1,340 @@
+import os
+import datetime
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import analytics
+import bar_cache
+import columnar
+import corporate_actions
+import export
+import fetcher
+import manifest
+import metrics
+import script1
+import script2
+import script3
+import streaming
+import universe
+import validation
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+UNIVERSE = os.getenv("UNIVERSE", "nifty50")
+TOP_N_SYMBOLS = 25
+MONTHLY_START = "1990-01-01"
+YEARLY_START = "1992-01-01"
+USE_BAR_CACHE = os.getenv("BAR_CACHE", "1") != "0"
+STAGES = ("yearly", "monthly", "daily")
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# One frame per (tickers, interval, range) for the lifetime of the run
+_downloads = {}
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Fetch the Universe Once
+# ──────────────────────────────────────────────────────────────
+def get_universe():
+    symbols = universe.get_symbols(UNIVERSE)
+    logging.info(f"✅ Fetched {len(symbols)} {UNIVERSE} symbols.")
+    return symbols, symbols[:TOP_N_SYMBOLS]
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Download Each (tickers, interval, range) Once
+# ──────────────────────────────────────────────────────────────
+def download(symbols, interval, start=None, end=None, period=None):
+    key = (tuple(symbols), interval, start, end, period)
+    if key in _downloads:
+        logging.info(f"♻️ Reusing {interval} download for {len(symbols)} symbols")
+        return _downloads[key]
+
+    try:
+        if USE_BAR_CACHE and period is None:
+            data = bar_cache.cached_download(list(symbols), interval, start, end)
+            _downloads[key] = data
+            return data
+
+        logging.info(f"⏳ Downloading {interval} data for {len(symbols)} symbols...")
+        data = fetcher.download(symbols, start=start, end=end, period=period, interval=interval)
+        if data is not None:
+            data = columnar.to_long(data, symbols)
+    except Exception as e:
+        logging.error(f"❌ Failed to download {interval} data: {e}")
+        return None
+
+    _downloads[key] = data
+    return data
+
+# Dividends and splits are cached next to the bars and refreshed incrementally. This runs
+# before the monthly download so that tickers whose cached bars predate a split are refetched
+def fetch_actions(symbols):
+    try:
+        with metrics.stage("fetch_actions", rows_in=len(symbols)) as stage:
+            actions = corporate_actions.cached_actions(symbols)
+            stage.rows_out = len(actions)
+        return actions
+    except Exception as e:
+        logging.error(f"❌ Failed to refresh corporate actions: {e}")
+        return None
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Validate Bars Before Any Transform Sees Them
+# ──────────────────────────────────────────────────────────────
+# Bad bars are dropped from the frame and returned as quarantine rows, without touching MySQL,
+# so runner.py's workers can screen their bars and leave the write to the parent
+def screen(data, symbols, interval, prefix=""):
+    if data is None or not validation.ENABLED:
+        return data, []
+    with metrics.stage(f"{prefix}validate_{interval}", rows_in=columnar.bar_count(data)) as stage:
+        data, quarantined = validation.validate(data, symbols, interval)
+        stage.rows_out = columnar.bar_count(data)
+    return data, quarantined
+
+# A failed quarantine write fails the run but the clean bars still go through
+def validate(data, symbols, interval):
+    data, quarantined = screen(data, symbols, interval)
+    return data, validation.store_quarantine(quarantined)
+
+# ──────────────────────────────────────────────────────────────
+# STEP 4: Fan Out to the Yearly, Monthly and Daily Stages
+# ──────────────────────────────────────────────────────────────
+# Each stage is skipped when the run manifest says an earlier attempt already finished it;
+# transform outputs are checkpointed so a failed store is retried without recomputing them
+def run_yearly(monthly_data, symbols, checkpoints, actions=None):
+    top_performers = checkpoints.artifact("yearly_transform")
+    if top_performers is None and monthly_data is None:
+        logging.error("❌ No monthly data to rank the years on. Exiting.")
+        return False
+    if top_performers is None:
+        yearly_data = monthly_data.loc[monthly_data.index >= YEARLY_START]
+        with metrics.stage("yearly_transform", rows_in=columnar.bar_count(yearly_data)) as stage:
+            yearly_returns = script1.compute_yearly_returns(yearly_data, symbols, actions)
+            top_performers = script1.identify_top_performers(yearly_returns)
+            held = []
+            if validation.ENABLED:
+                top_performers, held = validation.split_out_of_range(top_performers)
+            stage.rows_out = len(top_performers)
+        if not validation.store_quarantine(held):
+            return False
+        checkpoints.complete("yearly_transform", top_performers, rows=len(top_performers))
+    if top_performers and not checkpoints.done("yearly_store"):
+        with metrics.stage("yearly_store", rows_in=len(top_performers)):
+            if not script1.store_in_mysql(top_performers):
+                return False
+        checkpoints.complete("yearly_store", rows=len(top_performers))
+    return True
+
+def run_monthly(monthly_data, symbols, checkpoints, actions=None):
+    winners = checkpoints.artifact("monthly_transform")
+    if winners is None and monthly_data is None:
+        logging.error("❌ No monthly data to pick the winners from. Exiting.")
+        return False
+    if winners is None:
+        with metrics.stage("monthly_transform", rows_in=columnar.bar_count(monthly_data)) as stage:
+            winners = script2.get_monthly_winners(monthly_data, symbols, actions)
+            stage.rows_out = len(winners)
+        checkpoints.complete("monthly_transform", winners, rows=len(winners))
+    if winners and not checkpoints.done("monthly_store"):
+        with metrics.stage("monthly_store", rows_in=len(winners)):
+            if not script2.save_to_mysql(winners):
+                return False
+        checkpoints.complete("monthly_store", rows=len(winners))
+    return True
+
+# Chunks are downloaded, validated, turned into records and written in overlapping steps
+# joined by bounded queues: the first chunk is in MySQL while later ones are still downloading.
+# Each chunk is checkpointed once its commit succeeds, so a retry redoes only what never got stored.
+def run_daily_stream(missing, unstored, on_commit):
+    quarantined = []
+
+    def fetch(chunk):
+        return chunk, fetcher.download(chunk, period="1d", interval="1d", max_workers=1)
+
+    def transform(item):
+        chunk, data = item
+        if data is None:
+            return None
+        data = columnar.to_long(data, chunk)
+        if validation.ENABLED:
+            data, held = validation.validate(data, chunk, "1d")
+            quarantined.extend(held)
+        return script3.build_daily_records(data, chunk)
+
+    chunks = [missing[i:i + fetcher.CHUNK_SIZE] for i in range(0, len(missing), fetcher.CHUNK_SIZE)]
+    # Records a previous attempt fetched but did not store go out with the first batch
+    previous = [unstored] if unstored else []
+    try:
+        with metrics.stage("daily_stream", rows_in=len(missing)):
+            stored = streaming.run(
+                streaming.bounded_map(fetch, chunks, fetcher.MAX_WORKERS),
+                [transform],
+                lambda batches: script3.refresh_mysql_stream(itertools.chain(previous, batches), on_commit=on_commit),
+            )
+    except Exception as e:
+        logging.error(f"❌ Daily stream failed: {e}")
+        return False, False
+    return stored, validation.store_quarantine(quarantined)
+
+def run_daily(symbols, checkpoints):
+    # Per-ticker checkpoints: fetch_daily holds the records, daily_stored the tickers whose rows
+    # are committed. Both are written together after each commit, so a retry downloads only the
+    # tickers no attempt got and re-stores every fetched ticker that is not in daily_stored.
+    fetched = checkpoints.artifact("fetch_daily") or {}
+    stored = set(checkpoints.artifact("daily_stored") or ())
+    missing = [s for s in symbols if s.replace(".NS", "") not in fetched]
+    unstored = [r for ticker, r in fetched.items() if ticker not in stored]
+
+    def mark_stored(records):
+        fetched.update({r[0]: r for r in records})
+        stored.update(r[0] for r in records)
+        checkpoints.complete("fetch_daily", dict(fetched), rows=len(fetched))
+        checkpoints.complete("daily_stored", set(stored), rows=len(stored))
+
+    valid = True
+    if missing and streaming.ENABLED:
+        ok, valid = run_daily_stream(missing, unstored, mark_stored)
+        if not ok:
+            return False
+        if not fetched:
+            logging.error("❌ No stock data downloaded. Exiting.")
+            return False
+        return valid
+    if missing:
+        with metrics.stage("fetch_daily", rows_in=len(missing)) as stage:
+            daily_data = download(missing, "1d", period="1d")
+            stage.rows_out = columnar.bar_count(daily_data) if daily_data is not None else 0
+        daily_data, valid = validate(daily_data, missing, "1d")
+        if daily_data is not None:
+            with metrics.stage("daily_transform", rows_in=columnar.bar_count(daily_data)) as stage:
+                records = script3.build_daily_records(daily_data, missing)
+                stage.rows_out = len(records)
+            unstored += records
+    if not fetched and not unstored:
+        logging.error("❌ No stock data downloaded. Exiting.")
+        return False
+
+    if unstored:
+        with metrics.stage("daily_store", rows_in=len(unstored)):
+            if not script3.refresh_mysql_data(unstored, on_commit=mark_stored):
+                return False
+    return valid
+
+def run_analytics(symbols, checkpoints):
+    if checkpoints.done("rolling_metrics"):
+        return True
+    # Reads the bars the monthly fetch just cached; only bars after each ticker's state are computed
+    with metrics.stage("rolling_metrics", rows_in=len(symbols)) as stage:
+        stage.rows_out = analytics.update(symbols, "1mo")
+    if stage.rows_out is None:
+        return False
+    checkpoints.complete("rolling_metrics", rows=stage.rows_out)
+    return True
+
+def export_yearly(checkpoints):
+    top_performers = checkpoints.artifact("yearly_transform")
+    if not top_performers:
+        return 0
+    return export.export_yearly_top_performers(top_performers)
+
+def export_monthly(monthly_data, symbols, checkpoints):
+    rows = 0
+    # On a resumed run the bars were not re-read; they are exported with the next fetch
+    if monthly_data is not None:
+        rows += export.export_bars(monthly_data, symbols, "1mo")
+    winners = checkpoints.artifact("monthly_transform")
+    if winners:
+        rows += export.export_monthly_winners(winners)
+    return rows
+
+def export_daily(checkpoints):
+    fetched = checkpoints.artifact("fetch_daily")
+    if not fetched:
+        return 0
+    return export.export_stock_data(list(fetched.values()), script3.COLUMNS)
+
+def run_export(name, checkpoints, write, *args):
+    if not export.ENABLED or checkpoints.done(name):
+        return True
+    try:
+        with metrics.stage(name) as stage:
+            stage.rows_out = write(*args)
+    except Exception as e:
+        logging.error(f"❌ Parquet export failed: {e}")
+        return False
+    checkpoints.complete(name, rows=stage.rows_out)
+    return True
+
+def run_daily_branch(symbols, checkpoints):
+    ok = run_daily(symbols, checkpoints)
+    return run_export("export_daily", checkpoints, export_daily, checkpoints) and ok
+
+def run(checkpoints=None, stages=STAGES):
+    today = datetime.date.today()
+    checkpoints = checkpoints or manifest.Manifest(manifest.run_key(UNIVERSE, today))
+
+    # The symbol list is pinned for the day so a retry resumes over the same tickers
+    all_symbols = checkpoints.artifact("universe")
+    if all_symbols is None:
+        with metrics.stage("universe") as stage:
+            all_symbols, _ = get_universe()
+            stage.rows_out = len(all_symbols)
+        if not all_symbols:
+            logging.error("❌ No symbols fetched. Exiting.")
+            return False
+        checkpoints.complete("universe", all_symbols, rows=len(all_symbols))
+    top_symbols = all_symbols[:TOP_N_SYMBOLS]
+
+    # The daily refresh needs nothing from the history stages; when streaming it runs beside them
+    # on its own thread, so its downloads and writes overlap the monthly fetch and rankings
+    daily = None
+    if "daily" in stages and streaming.ENABLED:
+        background = ThreadPoolExecutor(max_workers=1)
+        daily = background.submit(metrics.bind(run_daily_branch), all_symbols, checkpoints)
+
+    ok = True
+    history_stages = [s for s in ("yearly", "monthly") if s in stages]
+    monthly_data = actions = None
+    # Loading the artifacts (not just checking the manifest) drops stages whose pickle is gone,
+    # so a lost checkpoint downloads the bars again instead of failing later without them
+    if any(checkpoints.artifact(f"{s}_transform") is None for s in history_stages):
+        # Without the actions the returns would silently fall back to price-only; retry instead
+        actions = fetch_actions(top_symbols)
+        ok = actions is not None
+    if actions is not None:
+        with metrics.stage("fetch_monthly", rows_in=len(top_symbols)) as stage:
+            monthly_data = download(top_symbols, "1mo", start=MONTHLY_START, end=today.strftime("%Y-%m-%d"))
+            stage.rows_out = columnar.bar_count(monthly_data) if monthly_data is not None else 0
+        if monthly_data is None:
+            ok = False
+        monthly_data, valid = validate(monthly_data, top_symbols, "1mo")
+        ok &= valid
+    if "yearly" in stages and (monthly_data is not None or checkpoints.done("yearly_transform")):
+        ok &= run_yearly(monthly_data, top_symbols, checkpoints, actions)
+        ok &= run_export("export_yearly", checkpoints, export_yearly, checkpoints)
+    if "monthly" in stages and (monthly_data is not None or checkpoints.done("monthly_transform")):
+        ok &= run_monthly(monthly_data, top_symbols, checkpoints, actions)
+        ok &= run_export("export_monthly", checkpoints, export_monthly, monthly_data, top_symbols, checkpoints)
+    del monthly_data
+    _downloads.clear()
+    if history_stages and USE_BAR_CACHE:
+        ok &= run_analytics(top_symbols, checkpoints)
+
+    if daily is not None:
+        ok &= daily.result()
+        background.shutdown()
+    elif "daily" in stages:
+        ok &= run_daily_branch(all_symbols, checkpoints)
+    return ok
+
+# ──────────────────────────────────────────────────────────────
+# MAIN
+# ──────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    manifest.prune()
+    ok = run()
+    metrics.write_prometheus()
+    if not ok:
+        exit(1)
@@ -0,0 +1,211 @@
+import os
+import json
+import argparse
+import datetime
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import columnar
+import fetcher
+import metrics
+import pipeline
+import script1
+import script2
+import script3
+import universe
+import validation
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+UNIVERSES_FILE = os.getenv("UNIVERSES_FILE", "universes.json")
+WORKERS = int(os.getenv("RUNNER_WORKERS", str(os.cpu_count() or 2)))
+# Daily snapshots are per ticker, so the union of all universes is split into shards of this size
+DAILY_SHARD_SIZE = int(os.getenv("RUNNER_DAILY_SHARD_SIZE", "100"))
+
+STAGES = ["yearly", "monthly", "daily"]
+BASE_TABLES = {
+    "yearly": "yearly_top_performers",
+    "monthly": "monthly_winners",
+    "daily": "stock_data",
+}
+STORES = {
+    "yearly": script1.store_in_mysql,
+    "monthly": script2.save_to_mysql,
+    "daily": script3.refresh_mysql_data,
+}
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Config-driven Universe Definitions
+# ──────────────────────────────────────────────────────────────
+# Each entry: name, index (key of universe.INDEX_LISTS, defaults to name), top_n for the
+# yearly/monthly rankings, stages to run and table_suffix (defaults to "_<name>")
+def load_universes(path=UNIVERSES_FILE, only=None):
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)["universes"]
+
+    universes = []
+    for entry in entries:
+        if only and entry["name"] not in only:
+            continue
+        stages = entry.get("stages", STAGES)
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stages {sorted(unknown)} for universe {entry['name']}")
+        universes.append({
+            "name": entry["name"],
+            "index": entry.get("index", entry["name"]),
+            "top_n": entry.get("top_n", pipeline.TOP_N_SYMBOLS),
+            "stages": stages,
+            "table_suffix": entry.get("table_suffix", f"_{entry['name']}"),
+        })
+    return universes
+
+
+def table_name(stage, spec):
+    return BASE_TABLES[stage] + spec["table_suffix"]
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Worker Tasks (compute only; rows are returned to the parent)
+# ──────────────────────────────────────────────────────────────
+def _init_worker(workers):
+    # Every process builds its own token bucket, so split the Yahoo request budget between them
+    fetcher.RATE_PER_SECOND = fetcher.RATE_PER_SECOND / workers
+    fetcher.BURST = max(1, fetcher.BURST // workers)
+
+
+def compute_history(spec, symbols):
+    name = spec["name"]
+    end = datetime.date.today().strftime("%Y-%m-%d")
+    actions = pipeline.fetch_actions(symbols)
+    if actions is None:
+        return {}
+    with metrics.stage(f"{name}:fetch_monthly", rows_in=len(symbols)) as stage:
+        monthly_data = pipeline.download(symbols, "1mo", start=pipeline.MONTHLY_START, end=end)
+        stage.rows_out = columnar.bar_count(monthly_data) if monthly_data is not None else 0
+    if monthly_data is None:
+        return {}
+    monthly_data, quarantined = pipeline.screen(monthly_data, symbols, "1mo", prefix=f"{name}:")
+
+    results = {"quarantine": quarantined}
+    if "yearly" in spec["stages"]:
+        yearly_data = monthly_data.loc[monthly_data.index >= pipeline.YEARLY_START]
+        with metrics.stage(f"{name}:yearly_transform", rows_in=columnar.bar_count(yearly_data)) as stage:
+            yearly_returns = script1.compute_yearly_returns(yearly_data, symbols, actions)
+            results["yearly"] = script1.identify_top_performers(yearly_returns)
+            if validation.ENABLED:
+                results["yearly"], held = validation.split_out_of_range(results["yearly"])
+                quarantined += held
+            stage.rows_out = len(results["yearly"])
+    if "monthly" in spec["stages"]:
+        with metrics.stage(f"{name}:monthly_transform", rows_in=columnar.bar_count(monthly_data)) as stage:
+            results["monthly"] = script2.get_monthly_winners(monthly_data, symbols, actions)
+            stage.rows_out = len(results["monthly"])
+
+    # Pool processes are reused across tasks; do not keep this universe's bars around
+    pipeline._downloads.clear()
+    return results
+
+
+# Returns (records, quarantine rows)
+def compute_daily(symbols):
+    with metrics.stage("fetch_daily_shard", rows_in=len(symbols)) as stage:
+        daily_data = pipeline.download(symbols, "1d", period="1d")
+        stage.rows_out = columnar.bar_count(daily_data) if daily_data is not None else 0
+    if daily_data is None:
+        return [], []
+    daily_data, quarantined = pipeline.screen(daily_data, symbols, "1d", prefix="shard:")
+    with metrics.stage("daily_transform_shard", rows_in=columnar.bar_count(daily_data)) as stage:
+        records = script3.build_daily_records(daily_data, symbols)
+        stage.rows_out = len(records)
+    pipeline._downloads.clear()
+    return records, quarantined
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Single Writer in the Parent Process
+# ──────────────────────────────────────────────────────────────
+# The stores log their own errors and return False; a failed write fails the run
+def write(stage, spec, rows):
+    if not rows:
+        return True
+    table = table_name(stage, spec)
+    with metrics.stage(f"{spec['name']}:{stage}_store", rows_in=len(rows)):
+        return STORES[stage](rows, table=table)
+
+
+def run(names=None, workers=None, path=UNIVERSES_FILE):
+    workers = workers or WORKERS
+    universes = load_universes(path, only=names)
+
+    with metrics.stage("universe") as stage:
+        members = {spec["name"]: universe.get_symbols(spec["index"]) for spec in universes}
+        stage.rows_out = sum(len(symbols) for symbols in members.values())
+    for spec in universes:
+        if not members[spec["name"]]:
+            logging.error(f"❌ No symbols fetched for {spec['name']}; skipping it")
+    universes = [spec for spec in universes if members[spec["name"]]]
+    if not universes:
+        return False
+
+    # Overlapping indices (Nifty 50 is inside Nifty 100, ...) download each ticker once
+    daily_symbols = list(dict.fromkeys(
+        symbol for spec in universes if "daily" in spec["stages"] for symbol in members[spec["name"]]
+    ))
+    shards = [daily_symbols[i:i + DAILY_SHARD_SIZE] for i in range(0, len(daily_symbols), DAILY_SHARD_SIZE)]
+
+    ok = True
+    daily_records = []
+    quarantined = []
+    logging.info(f"⏳ Running {len(universes)} universes and {len(shards)} daily shards on {workers} processes...")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workers,)) as pool:
+        futures = {}
+        for spec in universes:
+            if "yearly" in spec["stages"] or "monthly" in spec["stages"]:
+                symbols = members[spec["name"]][:spec["top_n"]]
+                futures[pool.submit(compute_history, spec, symbols)] = spec
+        for shard in shards:
+            futures[pool.submit(compute_daily, shard)] = None
+
+        # Workers keep computing while the parent writes finished results one table at a time
+        for future in as_completed(futures):
+            spec = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"❌ Worker failed for {spec['name'] if spec else 'daily shard'}: {e}")
+                ok = False
+                continue
+            if spec is None:
+                records, held = result
+                daily_records.extend(records)
+                quarantined.extend(held)
+                continue
+            quarantined.extend(result.pop("quarantine", []))
+            for stage, rows in result.items():
+                ok &= write(stage, spec, rows)
+
+    # Bad bars are held back from every universe's tables and quarantined once, by the parent
+    ok &= validation.store_quarantine(quarantined)
+    if not daily_records and shards:
+        logging.error("❌ No stock data downloaded.")
+        return False
+    for spec in universes:
+        if "daily" in spec["stages"]:
+            tickers = {symbol.replace(".NS", "") for symbol in members[spec["name"]]}
+            ok &= write("daily", spec, [r for r in daily_records if r[0] in tickers])
+    return ok
+
+# ──────────────────────────────────────────────────────────────
+# MAIN
+# ──────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the refresh stages for several index universes in parallel")
+    parser.add_argument("--config", default=UNIVERSES_FILE, help="universe definitions (JSON)")
+    parser.add_argument("--universes", nargs="+", help="only run these universe names")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    ok = run(args.universes, args.workers, args.config)
+    metrics.write_prometheus()
+    if not ok:
+        exit(1)
@@ -0,0 +1,491 @@
+import os
+import datetime
+import logging
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+# upsert  -> migrate the table in place and INSERT ... ON DUPLICATE KEY UPDATE the delta
+# replace -> legacy behaviour: DROP TABLE, CREATE and load everything again
+# swap    -> full rebuild into <table>__new, then one atomic RENAME TABLE; the previous
+#            generation stays as <table>__old for rollback
+REFRESH_MODE = os.getenv("REFRESH_MODE", "upsert")
+
+SHADOW_SUFFIX = "__new"
+PREVIOUS_SUFFIX = "__old"
+
+MIGRATIONS_TABLE = "schema_migrations"
+# One counter per table, bumped after every published refresh; readers cache per generation
+GENERATIONS_TABLE = "refresh_generations"
+# Rows dated before this year share one catch-all partition
+PARTITION_FIRST_YEAR = int(os.getenv("SCHEMA_PARTITION_FIRST_YEAR", "2020"))
+
+TABLES = {
+    "yearly_top_performers": {
+        "columns": [
+            ("id", "INT AUTO_INCREMENT PRIMARY KEY"),
+            ("year", "INT"),
+            ("year_rank", "INT"),
+            ("company", "VARCHAR(50)"),
+            ("return_pct", "DECIMAL(9,2)"),
+        ],
+        "unique": {"unique_year_rank": ["year", "year_rank"]},
+        # "How did X rank over the years"
+        "indexes": {"idx_company_year": ["company", "year"]},
+        "obsolete_keys": ["unique_year"],
+        "backfill": ["UPDATE {table} SET year_rank = 1 WHERE year_rank IS NULL"],
+    },
+    "monthly_winners": {
+        "columns": [
+            ("id", "INT AUTO_INCREMENT PRIMARY KEY"),
+            ("ticker", "VARCHAR(20)"),
+            ("date", "DATE"),
+            ("open", "DECIMAL(14,4)"),
+            ("high", "DECIMAL(14,4)"),
+            ("low", "DECIMAL(14,4)"),
+            ("close", "DECIMAL(14,4)"),
+            ("adj_close", "DECIMAL(14,4)"),
+            ("volume", "BIGINT"),
+            ("inserted_at", "DATETIME"),
+        ],
+        # One winner per month, so a re-ranked month replaces its previous winner
+        "unique": {"unique_month": ["date"]},
+        "indexes": {"idx_ticker_date": ["ticker", "date"]},
+    },
+    # Grows by one row per ticker per session: partitioned by year, so date-range reads and
+    # dropping old years only touch their own partitions. MySQL wants the partitioning column
+    # in every unique key, hence the (id, date) primary key.
+    "stock_data": {
+        "columns": [
+            ("id", "BIGINT NOT NULL AUTO_INCREMENT"),
+            ("ticker", "VARCHAR(20) NOT NULL"),
+            ("date", "DATE NOT NULL"),
+            ("open", "DECIMAL(14,4)"),
+            ("high", "DECIMAL(14,4)"),
+            ("low", "DECIMAL(14,4)"),
+            ("close", "DECIMAL(14,4)"),
+            ("adj_close", "DECIMAL(14,4)"),
+            ("volume", "BIGINT"),
+            ("inserted_at", "DATETIME"),
+        ],
+        "primary_key": ["id", "date"],
+        "unique": {"unique_ticker_date": ["ticker", "date"]},
+        # (ticker, date) range reads use the unique key; "every ticker on a day" uses this one
+        "indexes": {"idx_date": ["date"]},
+        "partition_by_year": "date",
+        # Each run loads one session's rows onto the history: a replace or swap would publish a
+        # table holding only today. Always upserted, whatever REFRESH_MODE says.
+        "append_only": True,
+    },
+    # Maintained incrementally by analytics.py; always upserted, whatever REFRESH_MODE says
+    "rolling_metrics": {
+        "columns": [
+            ("id", "INT AUTO_INCREMENT PRIMARY KEY"),
+            ("ticker", "VARCHAR(20)"),
+            ("bar_interval", "VARCHAR(4)"),
+            ("date", "DATE"),
+            ("close", "DECIMAL(14,4)"),
+            ("return_pct", "DECIMAL(8,2)"),
+            ("window_return_pct", "DECIMAL(10,2)"),
+            ("volatility_pct", "DECIMAL(8,2)"),
+            ("ma_short", "DECIMAL(14,4)"),
+            ("ma_long", "DECIMAL(14,4)"),
+            ("drawdown_pct", "DECIMAL(6,2)"),
+            ("max_drawdown_pct", "DECIMAL(6,2)"),
+            ("updated_at", "DATETIME"),
+        ],
+        "unique": {"unique_ticker_interval_date": ["ticker", "bar_interval", "date"]},
+        # Dashboards read one date across all tickers
+        "indexes": {"idx_interval_date": ["bar_interval", "date"]},
+    },
+    # Bars (and derived values) held back by validation.py; raw values, so no DECIMAL limits
+    "quarantine_bars": {
+        "columns": [
+            ("id", "INT AUTO_INCREMENT PRIMARY KEY"),
+            ("ticker", "VARCHAR(20)"),
+            ("bar_interval", "VARCHAR(4)"),
+            ("date", "DATE"),
+            ("open", "DOUBLE"),
+            ("high", "DOUBLE"),
+            ("low", "DOUBLE"),
+            ("close", "DOUBLE"),
+            ("adj_close", "DOUBLE"),
+            ("volume", "DOUBLE"),
+            ("reason", "VARCHAR(100)"),
+            ("detected_at", "DATETIME"),
+        ],
+        "unique": {"unique_ticker_interval_date": ["ticker", "bar_interval", "date"]},
+    },
+}
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: DDL
+# ──────────────────────────────────────────────────────────────
+def base_table(table):
+    if table in TABLES:
+        return table
+    # Per-universe copies such as stock_data_bank share the definition of their base table
+    for base in sorted(TABLES, key=len, reverse=True):
+        if table.startswith(base + "_"):
+            return base
+    raise KeyError(f"Unknown table: {table}")
+
+
+def table_spec(table):
+    return TABLES[base_table(table)]
+
+
+def _year_partitions(first_year, last_year):
+    parts = [f"PARTITION pold VALUES LESS THAN ({first_year})"]
+    parts += [f"PARTITION p{year} VALUES LESS THAN ({year + 1})" for year in range(first_year, last_year + 1)]
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return parts
+
+
+def partition_sql(table):
+    column = table_spec(table).get("partition_by_year")
+    if not column:
+        return ""
+    parts = _year_partitions(PARTITION_FIRST_YEAR, datetime.date.today().year + 1)
+    return f"PARTITION BY RANGE (YEAR({column})) (\n    " + ",\n    ".join(parts) + "\n)"
+
+
+def create_table_sql(table, name=None, with_keys=True):
+    spec = table_spec(table)
+    lines = [f"{column} {sql_type}" for column, sql_type in spec["columns"]]
+    if "primary_key" in spec:
+        lines.append(f"PRIMARY KEY ({', '.join(spec['primary_key'])})")
+    if with_keys:
+        lines += [f"UNIQUE KEY {key} ({', '.join(cols)})" for key, cols in spec["unique"].items()]
+        lines += [f"KEY {key} ({', '.join(cols)})" for key, cols in spec.get("indexes", {}).items()]
+    body = ",\n    ".join(lines)
+    sql = f"CREATE TABLE IF NOT EXISTS {name or table} (\n    {body}\n)"
+    partitions = partition_sql(table)
+    if partitions:
+        sql += "\n" + partitions
+    return sql + ";"
+
+
+def update_columns(table):
+    spec = table_spec(table)
+    keys = {col for cols in spec["unique"].values() for col in cols}
+    return [column for column, _ in spec["columns"] if column != "id" and column not in keys]
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Versioned Migrations
+# ──────────────────────────────────────────────────────────────
+# Changes the add-only pass in migrate_table cannot make to an existing table: new column
+# types, a new primary key, partitioning. New keys and indexes need no version; they are
+# added from TABLES on every run. Each version runs once per table (per-universe copies
+# included) and is recorded in schema_migrations. Steps are idempotent, so a version that
+# failed halfway is simply run again.
+def _modify_columns(*columns):
+    def step(cursor, table):
+        types = dict(table_spec(table)["columns"])
+        cursor.execute(f"ALTER TABLE {table} " + ", ".join(f"MODIFY {c} {types[c]}" for c in columns) + ";")
+    return step
+
+
+def _rebuild_primary_key(cursor, table):
+    spec = table_spec(table)
+    id_type = dict(spec["columns"])["id"]
+    # One statement: the AUTO_INCREMENT column must stay the head of a key throughout
+    cursor.execute(
+        f"ALTER TABLE {table} MODIFY id {id_type}, DROP PRIMARY KEY, "
+        f"ADD PRIMARY KEY ({', '.join(spec['primary_key'])});"
+    )
+
+
+def _partitions(cursor, table):
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    """, (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _partition_by_year(cursor, table):
+    if not _partitions(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} {partition_sql(table)};")
+
+
+MIGRATIONS = [
+    (1, "wider price and return columns", {
+        "yearly_top_performers": [_modify_columns("return_pct")],
+        "monthly_winners": [_modify_columns("open", "high", "low", "close", "adj_close")],
+        "stock_data": [_modify_columns("open", "high", "low", "close", "adj_close")],
+    }),
+    (2, "stock_data: (id, date) primary key and RANGE partitions by year", {
+        "stock_data": [
+            "DELETE FROM {table} WHERE ticker IS NULL OR date IS NULL;",
+            _modify_columns("ticker", "date"),
+            _rebuild_primary_key,
+            _partition_by_year,
+        ],
+    }),
+    (3, "4-decimal prices, matching the precision of adj_close", {
+        "monthly_winners": [_modify_columns("open", "high", "low", "close")],
+        "stock_data": [_modify_columns("open", "high", "low", "close")],
+        "rolling_metrics": [_modify_columns("close", "ma_short", "ma_long")],
+    }),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def _create_migrations_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            table_name VARCHAR(64) NOT NULL,
+            version INT NOT NULL,
+            description VARCHAR(255),
+            applied_at DATETIME,
+            PRIMARY KEY (table_name, version)
+        );
+    """)
+
+
+def applied_version(cursor, table):
+    _create_migrations_table(cursor)
+    cursor.execute(f"SELECT MAX(version) FROM {MIGRATIONS_TABLE} WHERE table_name = %s;", (table,))
+    rows = cursor.fetchall()
+    return (rows[0][0] if rows else None) or 0
+
+
+# created -> the table was just built from TABLES, so every version is recorded without running
+def apply_migrations(cursor, table, created=False):
+    current = applied_version(cursor, table)
+    base = base_table(table)
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        if not created and steps.get(base):
+            for step in steps[base]:
+                if callable(step):
+                    step(cursor, table)
+                else:
+                    cursor.execute(step.format(table=table))
+            logging.info(f"🛠️ Migrated {table} to schema v{version}: {description}")
+        cursor.execute(
+            f"INSERT IGNORE INTO {MIGRATIONS_TABLE} (table_name, version, description, applied_at) "
+            f"VALUES (%s, %s, %s, NOW());",
+            (table, version, description)
+        )
+
+
+# Splits the coming years off pmax while it is still empty, which makes the reorganise instant
+def ensure_year_partitions(cursor, table, until=None):
+    if not table_spec(table).get("partition_by_year"):
+        return
+    names = _partitions(cursor, table)
+    years = [int(name[1:]) for name in names if name[1:].isdigit()]
+    if "pmax" not in names or not years:
+        return
+    until = until or datetime.date.today().year + 1
+    missing = range(max(years) + 1, until + 1)
+    if not missing:
+        return
+    parts = [f"PARTITION p{year} VALUES LESS THAN ({year + 1})" for year in missing]
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({', '.join(parts)});")
+    logging.info(f"🛠️ Added partitions {', '.join(f'p{year}' for year in missing)} to {table}")
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: In-place Migration
+# ──────────────────────────────────────────────────────────────
+def _existing_columns(cursor, table):
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _existing_keys(cursor, table):
+    cursor.execute("""
+        SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate_table(cursor, table):
+    spec = table_spec(table)
+    created = not table_exists(cursor, table)
+    cursor.execute(create_table_sql(table))
+
+    columns = _existing_columns(cursor, table)
+    previous = None
+    for column, sql_type in spec["columns"]:
+        if column not in columns:
+            position = f" AFTER {previous}" if previous else " FIRST"
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}{position};")
+            logging.info(f"🛠️ Added column {table}.{column}")
+        previous = column
+
+    for statement in spec.get("backfill", []):
+        cursor.execute(statement.format(table=table))
+
+    keys = _existing_keys(cursor, table)
+    for key in spec.get("obsolete_keys", []):
+        if key in keys:
+            cursor.execute(f"ALTER TABLE {table} DROP INDEX {key};")
+            logging.info(f"🛠️ Dropped index {table}.{key}")
+
+    apply_migrations(cursor, table, created)
+    ensure_year_partitions(cursor, table)
+
+    for key, cols in spec["unique"].items():
+        if key in keys:
+            continue
+        # Tables created by the old DROP/CREATE runs may hold duplicates: keep the newest row
+        match = " AND ".join(f"a.{c} <=> b.{c}" for c in cols)
+        cursor.execute(f"DELETE a FROM {table} a JOIN {table} b ON {match} AND a.id < b.id;")
+        cursor.execute(f"ALTER TABLE {table} ADD UNIQUE KEY {key} ({', '.join(cols)});")
+        logging.info(f"🛠️ Added unique key {table}.{key}")
+
+    for key, cols in spec.get("indexes", {}).items():
+        if key not in keys:
+            cursor.execute(f"ALTER TABLE {table} ADD KEY {key} ({', '.join(cols)});")
+            logging.info(f"🛠️ Added index {table}.{key}")
+
+
+def refresh_mode(table, mode=None):
+    if table_spec(table).get("append_only"):
+        return "upsert"
+    return mode or REFRESH_MODE
+
+
+# Returns the table the caller should load into
+def prepare_table(cursor, table, mode=None):
+    mode = refresh_mode(table, mode)
+    if mode == "replace":
+        cursor.execute(f"DROP TABLE IF EXISTS {table};")
+        cursor.execute(create_table_sql(table))
+        apply_migrations(cursor, table, created=True)
+        return table
+    if mode == "upsert":
+        migrate_table(cursor, table)
+        return table
+    if mode == "swap":
+        return begin_swap(cursor, table)
+    raise ValueError(f"Unknown refresh mode: {mode}")
+
+
+# Call after the load has been committed; publishes the shadow table in swap mode
+def finish_table(cursor, table, mode=None):
+    if refresh_mode(table, mode) == "swap":
+        publish_swap(cursor, table)
+
+
+def last_value(cursor, table, column):
+    cursor.execute(f"SELECT MAX({column}) FROM {table};")
+    rows = cursor.fetchall()
+    return rows[0][0] if rows else None
+
+# ──────────────────────────────────────────────────────────────
+# STEP 4: Shadow-table Swap
+# ──────────────────────────────────────────────────────────────
+def table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    return cursor.fetchall()[0][0] > 0
+
+
+def begin_swap(cursor, table):
+    shadow = table + SHADOW_SUFFIX
+    # Leftovers from a run that failed before publishing are discarded
+    cursor.execute(f"DROP TABLE IF EXISTS {shadow};")
+    # Keys are built after the load, which is cheaper than maintaining them row by row
+    cursor.execute(create_table_sql(table, shadow, with_keys=False))
+    return shadow
+
+
+def publish_swap(cursor, table):
+    shadow = table + SHADOW_SUFFIX
+    previous = table + PREVIOUS_SUFFIX
+
+    spec = table_spec(table)
+    for key, cols in spec["unique"].items():
+        cursor.execute(f"ALTER TABLE {shadow} ADD UNIQUE KEY {key} ({', '.join(cols)});")
+    for key, cols in spec.get("indexes", {}).items():
+        cursor.execute(f"ALTER TABLE {shadow} ADD KEY {key} ({', '.join(cols)});")
+
+    cursor.execute(f"DROP TABLE IF EXISTS {previous};")
+    if table_exists(cursor, table):
+        cursor.execute(f"RENAME TABLE {table} TO {previous}, {shadow} TO {table};")
+    else:
+        cursor.execute(f"RENAME TABLE {shadow} TO {table};")
+    apply_migrations(cursor, table, created=True)
+    logging.info(f"🔁 Published {shadow} as {table} (previous generation kept as {previous})")
+
+
+def rollback_swap(cursor, table):
+    previous = table + PREVIOUS_SUFFIX
+    if not table_exists(cursor, previous):
+        raise RuntimeError(f"No previous generation {previous} to roll back to")
+    # Three-way rename in one statement: running it again rolls forward
+    scratch = table + "__swap"
+    cursor.execute(f"RENAME TABLE {table} TO {scratch}, {previous} TO {table}, {scratch} TO {previous};")
+    # The restored generation may predate a migration; the next upsert run re-applies them
+    _create_migrations_table(cursor)
+    cursor.execute(f"DELETE FROM {MIGRATIONS_TABLE} WHERE table_name = %s;", (table,))
+    bump_generation(cursor, table)
+    logging.info(f"↩️ Rolled {table} back to the previous generation")
+
+# ──────────────────────────────────────────────────────────────
+# STEP 5: Refresh Generations
+# ──────────────────────────────────────────────────────────────
+def _create_generations_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {GENERATIONS_TABLE} (
+            table_name VARCHAR(64) NOT NULL PRIMARY KEY,
+            generation BIGINT NOT NULL,
+            refreshed_at DATETIME
+        );
+    """)
+
+
+# Call once the new rows are visible (after finish_table): a reader that sees the new
+# generation must not be able to read, and cache, the old rows under it
+def bump_generation(cursor, table):
+    _create_generations_table(cursor)
+    cursor.execute(
+        f"INSERT INTO {GENERATIONS_TABLE} (table_name, generation, refreshed_at) VALUES (%s, 1, NOW()) "
+        f"ON DUPLICATE KEY UPDATE generation = generation + 1, refreshed_at = NOW();",
+        (table,)
+    )
+
+# ──────────────────────────────────────────────────────────────
+# MAIN: python schema.py rollback <table> | migrate [<table> ...]
+# ──────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    import sys
+    import mysql.connector
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    command, tables = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if not (command == "rollback" and len(tables) == 1 or command == "migrate"):
+        print(f"usage: python schema.py rollback|migrate {{{'|'.join(TABLES)}}}[_<universe>]")
+        exit(2)
+    # migrate with no tables: every base table, e.g. to partition stock_data ahead of a run
+    tables = tables or list(TABLES)
+    for table in tables:
+        table_spec(table)
+
+    conn = mysql.connector.connect(
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASS"),
+        database=os.getenv("DB_NAME")
+    )
+    cursor = conn.cursor()
+    for table in tables:
+        if command == "rollback":
+            rollback_swap(cursor, table)
+        else:
+            migrate_table(cursor, table)
+    conn.commit()
+    cursor.close()
+    conn.close()
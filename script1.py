@@ -1,8 +1,12 @@
 import os
-import requests
-import yfinance as yf
+import columnar
+import corporate_actions
+import fetcher
+import universe
 import datetime
-import mysql.connector
+import db
+import schema
+import numpy as np
 import pandas as pd
 import logging
 
@@ -14,6 +18,13 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 
+# Which companies are kept per year (see identify_top_performers)
+TOP_N = int(os.getenv("YEARLY_TOP_N", "1"))
+SELECTION = os.getenv("YEARLY_SELECTION", "top")
+PERCENTILE = float(os.getenv("YEARLY_PERCENTILE", "90"))
+
+COLUMNS = ["year", "year_rank", "company", "return_pct"]
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -22,125 +33,129 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 # STEP 1: Get Nifty Top 25 Symbols
 # ────────────────────────────────────────────────
 def get_nifty_25_symbols():
-    url_csv = "https://www.niftyindices.com/IndexConstituent/ind_nifty50list.csv"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    try:
-        response = requests.get(url_csv, headers=headers)
-        response.raise_for_status()
-        lines = response.text.strip().split("\n")[1:]
-        symbols = []
-
-        for line in lines[:25]:
-            parts = line.split(",")
-            name = parts[2].strip().replace("&", "and")
-            symbols.append(name + ".NS")
-
+    symbols = universe.get_symbols("nifty50", limit=25)
+    if symbols:
         logging.info(f"✅ Fetched {len(symbols)} symbols from Nifty 50 list")
-        return symbols
-
-    except Exception as e:
-        logging.error(f"❌ Failed to fetch Nifty list: {e}")
-        return []
+    return symbols
 
 
 # ────────────────────────────────────────────────
 # STEP 2: Download Monthly Data & Calculate Yearly Returns
 # ────────────────────────────────────────────────
-def fetch_yearly_returns(symbols):
-    all_yearly_returns = {}
-
+def download_yearly_data(symbols):
     try:
-        data = yf.download(
-            tickers=symbols,
+        return fetcher.download(
+            symbols,
             start="1992-01-01",
             end=datetime.date.today().strftime("%Y-%m-%d"),
-            interval="1mo",
-            group_by="ticker",
-            auto_adjust=False,
-            threads=True
+            interval="1mo"
         )
     except Exception as e:
         logging.error(f"❌ Failed to download stock data: {e}")
-        return {}
+        return None
+
 
+# actions: cached dividends/splits (corporate_actions.load); None ranks on price change alone
+def compute_yearly_returns(data, symbols, actions=None):
+    available = set(columnar.symbols_in(data))
     for symbol in symbols:
-        try:
-            df = data[symbol].dropna()
-            df.index = pd.to_datetime(df.index)
-            df = df.resample('Y').agg({
-                'Open': 'first',
-                'Close': 'last'
-            }).dropna()
-            df['return_pct'] = ((df['Close'] - df['Open']) / df['Open']) * 100
-
-            for year, row in df.iterrows():
-                year_int = year.year
-                if year_int not in all_yearly_returns:
-                    all_yearly_returns[year_int] = []
-                all_yearly_returns[year_int].append({
-                    "symbol": symbol.replace(".NS", ""),
-                    "return_pct": round(row["return_pct"], 2)
-                })
-
-        except Exception as e:
-            logging.warning(f"⚠️ Skipped {symbol} due to error: {e}")
-
-    return all_yearly_returns
+        if symbol not in available:
+            logging.warning(f"⚠️ Skipped {symbol}: no data downloaded")
+    symbols = [s for s in symbols if s in available]
+
+    dates, fields = columnar.panel(data, symbols, fields=["Open", "Close"])
+
+    # A bar only counts when every field is present, like a per-ticker dropna(); the other
+    # fields are checked one matrix at a time
+    complete = ~np.isnan(fields["Open"]) & ~np.isnan(fields["Close"])
+    for field in columnar.FIELDS:
+        if field not in fields:
+            complete &= ~np.isnan(columnar.panel(data, symbols, fields=[field])[1][field])
+
+    adjusted_opens, adjusted_closes = corporate_actions.adjust(dates, symbols, fields, actions)
+    opens = pd.DataFrame(np.where(complete, adjusted_opens, np.nan), index=dates)
+    closes = pd.DataFrame(np.where(complete, adjusted_closes, np.nan), index=dates)
+    first_open = opens.groupby(dates.year).first()
+    last_close = closes.groupby(dates.year).last()
+
+    yearly_returns = ((last_close - first_open) / first_open * 100).round(2)
+    yearly_returns.columns = [s.replace(".NS", "") for s in symbols]
+    yearly_returns.index.name = "year"
+    return yearly_returns
+
+
+def fetch_yearly_returns(symbols):
+    data = download_yearly_data(symbols)
+    if data is None:
+        return pd.DataFrame()
+    return compute_yearly_returns(data, symbols, corporate_actions.cached_actions(symbols))
 
 
 # ────────────────────────────────────────────────
 # STEP 3: Identify Top Performers Each Year
 # ────────────────────────────────────────────────
-def identify_top_performers(yearly_returns):
-    top_performers = []
+# selection: "top" / "bottom" keep the best / worst top_n per year,
+# "percentile" keeps every company at or above that percentile, "all" keeps the flat ranking
+def identify_top_performers(yearly_returns, top_n=TOP_N, selection=SELECTION, percentile=PERCENTILE):
+    if yearly_returns.empty:
+        return []
+
+    ascending = selection == "bottom"
+    ranks = yearly_returns.rank(axis=1, ascending=ascending, method="first")
 
-    for year in sorted(yearly_returns.keys()):
-        companies = yearly_returns[year]
-        if not companies:
-            continue
-        best = max(companies, key=lambda x: x["return_pct"])
-        top_performers.append((year, best["symbol"], best["return_pct"]))
+    if selection in ("top", "bottom"):
+        selected = ranks <= top_n
+    elif selection == "percentile":
+        cutoff = yearly_returns.quantile(percentile / 100, axis=1)
+        selected = yearly_returns.ge(cutoff, axis=0)
+    elif selection == "all":
+        selected = yearly_returns.notna()
+    else:
+        raise ValueError(f"Unknown selection mode: {selection}")
 
-    return top_performers
+    rows, cols = np.nonzero(selected.to_numpy() & yearly_returns.notna().to_numpy())
+    order = np.lexsort((ranks.to_numpy()[rows, cols], rows))
+    rows, cols = rows[order], cols[order]
+
+    return list(zip(
+        yearly_returns.index.to_numpy()[rows].tolist(),
+        ranks.to_numpy()[rows, cols].astype(int).tolist(),
+        yearly_returns.columns.to_numpy()[cols].tolist(),
+        yearly_returns.to_numpy()[rows, cols].tolist()
+    ))
 
 
 # ────────────────────────────────────────────────
 # STEP 4: Store Results in MySQL
 # ────────────────────────────────────────────────
-def store_in_mysql(records):
+def store_in_mysql(records, table="yearly_top_performers"):
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME
-        )
-        cursor = conn.cursor()
-
-        cursor.execute("DROP TABLE IF EXISTS yearly_top_performers;")
-        cursor.execute("""
-            CREATE TABLE yearly_top_performers (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                year INT,
-                company VARCHAR(50),
-                return_pct DECIMAL(6,2),
-                UNIQUE KEY unique_year (year)
-            );
-        """)
-
-        for year, company, return_pct in records:
-            cursor.execute("""
-                INSERT INTO yearly_top_performers (year, company, return_pct)
-                VALUES (%s, %s, %s)
-            """, (year, company, return_pct))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db.session(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME) as conn:
+            cursor = conn.cursor()
+
+            target = schema.prepare_table(cursor, table)
+            if schema.refresh_mode(table) == "upsert":
+                # Earlier years are final; only the latest stored year onwards can change
+                since = schema.last_value(cursor, table, "year")
+                if since is not None:
+                    records = [r for r in records if r[0] >= since]
+
+            db.write_rows(
+                conn, target, COLUMNS, records,
+                update_columns=schema.update_columns(table)
+            )
+
+            conn.commit()
+            schema.finish_table(cursor, table)
+            schema.bump_generation(cursor, table)
+            conn.commit()
+            cursor.close()
 
         logging.info("✅ Yearly top performers stored in MySQL.")
+        return True
     except Exception as e:
         logging.error(f"❌ MySQL Error: {e}")
+        return False
 
 
 # ────────────────────────────────────────────────
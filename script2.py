@@ -1,9 +1,13 @@
 import os
-import requests
-import yfinance as yf
+import columnar
+import corporate_actions
+import fetcher
+import universe
 import datetime
+import numpy as np
 import pandas as pd
-import mysql.connector
+import db
+import schema
 import logging
 
 # ──────────────────────────────────────────────────────────────
@@ -14,30 +18,18 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 
+COLUMNS = ["ticker", "date", "open", "high", "low", "close", "adj_close", "volume", "inserted_at"]
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 # ──────────────────────────────────────────────────────────────
 # STEP 1: Get Top 25 Nifty Symbols
 # ──────────────────────────────────────────────────────────────
 def get_nifty_25_symbols():
-    url_csv = "https://www.niftyindices.com/IndexConstituent/ind_nifty50list.csv"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    try:
-        response = requests.get(url_csv, headers=headers)
-        response.raise_for_status()
-        lines = response.text.strip().split("\n")[1:]
-        symbols = []
-
-        for line in lines[:25]:
-            parts = line.split(",")
-            name = parts[2].strip().replace("&", "and")
-            symbols.append(name + ".NS")
-
+    symbols = universe.get_symbols("nifty50", limit=25)
+    if symbols:
         logging.info(f"✅ Nifty 25: {symbols}")
-        return symbols
-    except Exception as e:
-        logging.error(f"❌ Failed to fetch Nifty list: {e}")
-        return []
+    return symbols
 
 # ──────────────────────────────────────────────────────────────
 # STEP 2: Fetch Monthly OHLCV Data
@@ -45,14 +37,14 @@ def get_nifty_25_symbols():
 def fetch_monthly_data(symbols):
     try:
         logging.info("⏳ Downloading monthly stock data...")
-        data = yf.download(
-            tickers=" ".join(symbols),
+        data = fetcher.download(
+            symbols,
             start="1990-01-01",
             end=datetime.datetime.now().strftime("%Y-%m-%d"),
-            interval="1mo",
-            group_by="ticker",
-            threads=True
+            interval="1mo"
         )
+        if data is None:
+            raise RuntimeError("no symbol could be downloaded")
         logging.info("✅ Data downloaded successfully.")
         return data
     except Exception as e:
@@ -62,42 +54,76 @@ def fetch_monthly_data(symbols):
 # ──────────────────────────────────────────────────────────────
 # STEP 3: Identify Monthly Winners
 # ──────────────────────────────────────────────────────────────
-def get_monthly_winners(data, symbols):
-    monthly_winners = []
-    months = pd.date_range("1990-01-01", datetime.date.today(), freq="MS")
-
-    for month in months:
-        month_records = []
-
-        for symbol in symbols:
-            try:
-                symbol_df = data[symbol].dropna(subset=["Open", "Close"])
-                row = symbol_df[(symbol_df.index.month == month.month) & (symbol_df.index.year == month.year)]
-                if row.empty:
-                    continue
-
-                row = row.iloc[0]
-                gain_pct = ((row["Close"] - row["Open"]) / row["Open"]) * 100
-
-                month_records.append({
-                    "symbol": symbol.replace(".NS", ""),
-                    "date": row.name.date(),
-                    "open": float(row["Open"]),
-                    "high": float(row["High"]),
-                    "low": float(row["Low"]),
-                    "close": float(row["Close"]),
-                    "adj_close": float(row.get("Adj Close", row["Close"])),
-                    "volume": int(row["Volume"]),
-                    "gain_pct": round(gain_pct, 2),
-                    "inserted_at": datetime.datetime.now()
-                })
-
-            except Exception as e:
-                logging.warning(f"⚠️ Skipped {symbol} in {month.strftime('%Y-%m')} due to: {e}")
-
-        if month_records:
-            best = max(month_records, key=lambda x: x["gain_pct"])
-            monthly_winners.append(best)
+# actions: cached dividends/splits (corporate_actions.load); None ranks on price change alone
+def get_monthly_winners(data, symbols, actions=None):
+    available = set(columnar.symbols_in(data))
+    for symbol in symbols:
+        if symbol not in available:
+            logging.warning(f"⚠️ Skipped {symbol}: no data downloaded")
+    symbols = [s for s in symbols if s in available]
+    if not symbols:
+        return []
+
+    today = datetime.date.today()
+    dates, fields = columnar.panel(data, symbols, fields=["Open", "Close", "Volume"])
+    in_range = (dates >= pd.Timestamp("1990-01-01")) & (dates < pd.Timestamp(today.year, today.month, 1) + pd.offsets.MonthBegin())
+
+    opens = fields["Open"]
+    closes = fields["Close"]
+    valid = ~np.isnan(opens) & ~np.isnan(closes) & in_range[:, None]
+
+    # First usable bar of each (month, ticker): min row position over the month's valid rows
+    n_rows = len(dates)
+    positions = np.where(valid, np.arange(n_rows)[:, None], n_rows)
+    month_keys = dates.year * 12 + dates.month - 1
+    first = pd.DataFrame(positions).groupby(month_keys).min().to_numpy()
+    has_bar = first < n_rows
+    first = np.where(has_bar, first, 0)
+    cols = np.broadcast_to(np.arange(len(symbols)), first.shape)
+
+    # Ranked on the adjusted bar; the stored row keeps the prices as downloaded
+    adjusted_opens, adjusted_closes = corporate_actions.adjust(dates, symbols, fields, actions)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gains = np.round(
+            (adjusted_closes[first, cols] - adjusted_opens[first, cols]) / adjusted_opens[first, cols] * 100, 2
+        )
+
+    volumes = fields["Volume"][first, cols]
+    candidates = has_bar & ~np.isnan(volumes)
+    ranked = np.where(candidates, np.nan_to_num(gains, nan=-np.inf), -np.inf)
+    winner_cols = ranked.argmax(axis=1)
+    months = np.flatnonzero(candidates.any(axis=1))
+    winner_cols = winner_cols[months]
+    rows = first[months, winner_cols]
+    # Only the winners' bars need these, so they are never materialised for the whole panel
+    extra = {field: columnar.field_at(data, symbols, field, rows, winner_cols) for field in ("High", "Low", "Adj Close")}
+
+    inserted_at = datetime.datetime.now()
+    monthly_winners = [
+        {
+            "symbol": symbol.replace(".NS", ""),
+            "date": date.date(),
+            "open": o,
+            "high": h,
+            "low": l,
+            "close": c,
+            "adj_close": a,
+            "volume": int(v),
+            "gain_pct": g,
+            "inserted_at": inserted_at
+        }
+        for symbol, date, o, h, l, c, a, v, g in zip(
+            np.asarray(symbols)[winner_cols],
+            dates[rows],
+            opens[rows, winner_cols].tolist(),
+            extra["High"].tolist(),
+            extra["Low"].tolist(),
+            closes[rows, winner_cols].tolist(),
+            extra["Adj Close"].tolist(),
+            volumes[months, winner_cols].tolist(),
+            gains[months, winner_cols]
+        )
+    ]
 
     logging.info(f"📊 Total monthly winners: {len(monthly_winners)}")
     return monthly_winners
@@ -105,55 +131,43 @@ def get_monthly_winners(data, symbols):
 # ──────────────────────────────────────────────────────────────
 # STEP 4: Store Winners to MySQL
 # ──────────────────────────────────────────────────────────────
-def save_to_mysql(monthly_winners):
+def to_rows(monthly_winners):
+    return [
+        (r["symbol"], r["date"], r["open"], r["high"], r["low"],
+         r["close"], r["adj_close"], r["volume"], r["inserted_at"])
+        for r in monthly_winners
+    ]
+
+def save_to_mysql(monthly_winners, table="monthly_winners"):
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME
-        )
-        cursor = conn.cursor()
-
-        cursor.execute("DROP TABLE IF EXISTS monthly_winners;")
-        cursor.execute("""
-            CREATE TABLE monthly_winners (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                ticker VARCHAR(20),
-                date DATE,
-                open DECIMAL(10,2),
-                high DECIMAL(10,2),
-                low DECIMAL(10,2),
-                close DECIMAL(10,2),
-                adj_close DECIMAL(10,2),
-                volume BIGINT,
-                inserted_at DATETIME
-            );
-        """)
-
-        for record in monthly_winners:
-            cursor.execute("""
-                INSERT INTO monthly_winners 
-                (ticker, date, open, high, low, close, adj_close, volume, inserted_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                record["symbol"],
-                record["date"],
-                record["open"],
-                record["high"],
-                record["low"],
-                record["close"],
-                record["adj_close"],
-                record["volume"],
-                record["inserted_at"]
-            ))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db.session(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME) as conn:
+            cursor = conn.cursor()
+
+            target = schema.prepare_table(cursor, table)
+            if schema.refresh_mode(table) == "upsert":
+                # Earlier months are final; only the latest stored month onwards can change
+                since = schema.last_value(cursor, table, "date")
+                if since is not None:
+                    monthly_winners = [r for r in monthly_winners if r["date"] >= since]
+
+            db.write_rows(
+                conn,
+                target,
+                COLUMNS,
+                to_rows(monthly_winners),
+                update_columns=schema.update_columns(table)
+            )
+
+            conn.commit()
+            schema.finish_table(cursor, table)
+            schema.bump_generation(cursor, table)
+            conn.commit()
+            cursor.close()
         logging.info("✅ Monthly winners saved to MySQL.")
+        return True
     except Exception as e:
         logging.error(f"❌ MySQL Error: {e}")
+        return False
 
 # ──────────────────────────────────────────────────────────────
 # MAIN
@@ -162,6 +176,6 @@ if __name__ == "__main__":
     symbols = get_nifty_25_symbols()
     data = fetch_monthly_data(symbols)
     if data is not None:
-        winners = get_monthly_winners(data, symbols)
+        winners = get_monthly_winners(data, symbols, corporate_actions.cached_actions(symbols))
         if winners:
             save_to_mysql(winners)
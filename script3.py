@@ -1,8 +1,11 @@
 import os
-import requests
-import yfinance as yf
+import columnar
+import fetcher
+import universe
 import datetime
-import mysql.connector
+import db
+import schema
+import numpy as np
 import logging
 
 # ──────────────────────────────────────────────────────────────
@@ -13,120 +16,109 @@ DB_NAME = os.getenv("DB_NAME", "stocks")
 DB_USER = os.getenv("DB_USER", "Googleclouddata")
 DB_PASS = os.getenv("DB_PASS", "%\\LA*HA9[\">;C=pv")
 
+COLUMNS = ["ticker", "date", "open", "high", "low", "close", "adj_close", "volume", "inserted_at"]
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 # ──────────────────────────────────────────────────────────────
 # STEP 1: Get Nifty 50 Symbols
 # ──────────────────────────────────────────────────────────────
 def get_nifty_50_symbols():
-    url_csv = "https://www.niftyindices.com/IndexConstituent/ind_nifty50list.csv"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    try:
-        response = requests.get(url_csv, headers=headers)
-        response.raise_for_status()
-        lines = response.text.strip().split("\n")[1:]
-        symbols = []
-
-        for line in lines:
-            parts = line.split(",")
-            name = parts[2].strip().replace("&", "and")
-            symbols.append(name + ".NS")
-
+    symbols = universe.get_symbols("nifty50")
+    if symbols:
         logging.info(f"✅ Fetched {len(symbols)} Nifty 50 symbols.")
-        return symbols
-    except Exception as e:
-        logging.error(f"❌ Failed to fetch Nifty list: {e}")
-        return []
+    return symbols
 
 # ──────────────────────────────────────────────────────────────
 # STEP 2: Fetch Daily Stock Data
 # ──────────────────────────────────────────────────────────────
-def fetch_stock_data(symbols):
+def download_daily_data(symbols):
     try:
         logging.info("⏳ Downloading today's data for all Nifty 50 stocks...")
-        data = yf.download(
-            tickers=" ".join(symbols),
-            period="1d",
-            interval="1d",
-            group_by="ticker",
-            auto_adjust=False,
-            threads=True
-        )
+        return fetcher.download(symbols, period="1d", interval="1d")
     except Exception as e:
         logging.error(f"❌ Failed to download stock data: {e}")
+        return None
+
+def build_daily_records(data, symbols):
+    dates, fields = columnar.panel(data, symbols, fields=["Close", "Volume"])
+    if not len(dates):
+        logging.info("✅ Fetched data for 0 symbols.")
         return []
 
-    today = datetime.date.today()
-    all_data = []
-
-    for symbol in symbols:
-        try:
-            stock = data[symbol]
-            if stock.empty:
-                continue
-
-            latest = stock.iloc[-1]
-
-            record = (
-                symbol.replace(".NS", ""),
-                str(today),
-                float(latest["Open"]),
-                float(latest["High"]),
-                float(latest["Low"]),
-                float(latest["Close"]),
-                float(latest.get("Adj Close", latest["Close"])),
-                int(latest["Volume"]),
-                datetime.datetime.now()
-            )
-            all_data.append(record)
-        except Exception as e:
-            logging.warning(f"⚠️ Skipped {symbol} due to error: {e}")
+    # Latest complete bar of every symbol, stored under its own session date: before the
+    # open, period="1d" still returns the previous session. A missing volume cannot be a BIGINT.
+    valid = ~np.isnan(fields["Close"]) & ~np.isnan(fields["Volume"])
+    usable = valid.any(axis=0)
+    rows = len(dates) - 1 - valid[::-1].argmax(axis=0)
+    skipped = [s for s, ok in zip(symbols, usable) if not ok]
+    if skipped:
+        logging.warning(f"⚠️ Skipped {skipped}: no complete bar downloaded")
+
+    rows, cols = rows[usable], np.flatnonzero(usable)
+    # The other fields are only needed at these bars, one matrix at a time
+    latest = {
+        field: (fields[field][rows, cols] if field in fields else columnar.field_at(data, symbols, field, rows, cols)).tolist()
+        for field in columnar.FIELDS
+    }
+    inserted_at = datetime.datetime.now()
+    all_data = [
+        (symbol.replace(".NS", ""), str(date.date()), o, h, l, c, a, int(v), inserted_at)
+        for symbol, date, o, h, l, c, a, v in zip(
+            np.asarray(symbols)[cols],
+            dates[rows],
+            latest["Open"],
+            latest["High"],
+            latest["Low"],
+            latest["Close"],
+            latest["Adj Close"],
+            latest["Volume"]
+        )
+    ]
 
     logging.info(f"✅ Fetched data for {len(all_data)} symbols.")
     return all_data
 
+def fetch_stock_data(symbols):
+    data = download_daily_data(symbols)
+    if data is None:
+        return []
+    return build_daily_records(data, symbols)
+
 # ──────────────────────────────────────────────────────────────
-# STEP 3: Save to MySQL (fresh table)
+# STEP 3: Save to MySQL (upsert by ticker and date)
 # ──────────────────────────────────────────────────────────────
-def refresh_mysql_data(records):
+# batches: any iterable of record lists, e.g. fed from a queue while later chunks are still
+# downloading; each batch is committed as it arrives and then passed to on_commit
+def refresh_mysql_stream(batches, table="stock_data", on_commit=None):
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME
-        )
-        cursor = conn.cursor()
-
-        cursor.execute("DROP TABLE IF EXISTS stock_data;")
-        cursor.execute("""
-            CREATE TABLE stock_data (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                ticker VARCHAR(20),
-                date DATE,
-                open DECIMAL(10,2),
-                high DECIMAL(10,2),
-                low DECIMAL(10,2),
-                close DECIMAL(10,2),
-                adj_close DECIMAL(10,2),
-                volume BIGINT,
-                inserted_at DATETIME,
-                UNIQUE KEY unique_ticker_date (ticker, date)
-            );
-        """)
-
-        cursor.executemany("""
-            INSERT INTO stock_data
-            (ticker, date, open, high, low, close, adj_close, volume, inserted_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, records)
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db.session(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME) as conn:
+            cursor = conn.cursor()
+
+            target = schema.prepare_table(cursor, table)
+
+            for records in batches:
+                db.write_rows(
+                    conn,
+                    target,
+                    COLUMNS,
+                    records,
+                    update_columns=schema.update_columns(table)
+                )
+                conn.commit()
+                if on_commit:
+                    on_commit(records)
+
+            schema.finish_table(cursor, table)
+            cursor.close()
         logging.info("✅ Daily Nifty 50 stock data refreshed in MySQL.")
+        return True
     except Exception as e:
         logging.error(f"❌ MySQL Error: {e}")
+        return False
+
+def refresh_mysql_data(records, table="stock_data", on_commit=None):
+    return refresh_mysql_stream([records], table, on_commit)
 
 # ──────────────────────────────────────────────────────────────
 # MAIN EXECUTION
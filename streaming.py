@@ -0,0 +1,119 @@
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import metrics
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+# PIPELINE_STREAM=0 runs the daily stage (and the stages around it) one after another again
+ENABLED = os.getenv("PIPELINE_STREAM", "1") != "0"
+# Items allowed to wait between two stages before the upstream stage blocks
+QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+# Raised into the sink when an upstream stage fails, so it never mistakes a cut-off stream
+# for a finished one (and e.g. publishes a half-loaded table)
+class StreamAborted(RuntimeError):
+    pass
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Bounded Producer
+# ──────────────────────────────────────────────────────────────
+# fn(item) on a pool, yielding results as they finish. At most `workers` calls are in flight
+# and a new one only starts once the consumer has taken a result, so a blocked consumer
+# stops the downloads instead of letting finished frames pile up in memory.
+def bounded_map(fn, items, workers):
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fn = metrics.bind(fn)
+        pending = {pool.submit(fn, item) for _, item in zip(range(workers), items)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                for item in items:
+                    pending.add(pool.submit(fn, item))
+                    break
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Stages Joined by Bounded Queues
+# ──────────────────────────────────────────────────────────────
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _pump(items, fn, out, stop, errors):
+    try:
+        for item in items:
+            if stop.is_set():
+                break
+            result = fn(item) if fn else item
+            if result is not None and not _put(out, result, stop):
+                break
+    except StreamAborted:
+        # The failing stage upstream has already recorded its error
+        pass
+    except Exception as e:
+        logging.error(f"❌ Stream stage failed: {e}")
+        errors.append(e)
+        stop.set()
+    finally:
+        # Closing a generator source (e.g. bounded_map) shuts its pool down with it
+        if hasattr(items, "close"):
+            items.close()
+        _put(out, _DONE, stop)
+
+
+def _drain(q, stop, errors):
+    while True:
+        if stop.is_set():
+            raise StreamAborted("an upstream stage failed") from (errors[0] if errors else None)
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+# source -> each step on its own thread -> sink(iterator) on the calling thread. Steps return
+# None to drop an item. A failing stage, or a sink that returns early, stops every stage; the
+# sink's iterator raises StreamAborted and the first error is raised once the threads have wound down.
+def run(source, steps, sink, maxsize=QUEUE_SIZE):
+    stop = threading.Event()
+    errors = []
+    threads = []
+    items = source
+    for fn in [None, *steps]:
+        out = queue.Queue(maxsize)
+        thread = threading.Thread(target=metrics.bind(_pump), args=(items, fn, out, stop, errors), daemon=True)
+        thread.start()
+        threads.append(thread)
+        items = _drain(out, stop, errors)
+
+    result = None
+    try:
+        result = sink(items)
+    except StreamAborted:
+        # The stage's own error is raised below
+        pass
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return result
@@ -0,0 +1,54 @@
+import pytest
+
+import fake_mysql
+import schema
+import script3
+import streaming
+
+
+def _fail_on(bad):
+    def step(item):
+        if item == bad:
+            raise RuntimeError(f"chunk {item} failed")
+        return [item]
+    return step
+
+
+def test_sink_receives_every_item():
+    assert streaming.run(iter(range(10)), [lambda x: x * 2], list) == [x * 2 for x in range(10)]
+
+
+def test_failed_stage_raises_into_the_sink():
+    finished = []
+
+    def sink(batches):
+        for _ in batches:
+            pass
+        finished.append(True)
+
+    with pytest.raises(RuntimeError, match="chunk 2 failed"):
+        streaming.run(iter(range(5)), [_fail_on(2)], sink, maxsize=1)
+    assert not finished
+
+
+def test_failed_stream_does_not_publish_swap_table(monkeypatch):
+    monkeypatch.setattr(schema, "REFRESH_MODE", "swap")
+    statements = []
+    execute = fake_mysql.FakeCursor.execute
+
+    def recording_execute(self, sql, params=None):
+        statements.append(sql)
+        return execute(self, sql, params)
+
+    monkeypatch.setattr(fake_mysql.FakeCursor, "execute", recording_execute)
+    rows = [("A", "2024-01-31", 1, 1, 1, 1, 1, 1, None)]
+    with fake_mysql.patched_connect(fake_mysql.FakeConnection()):
+        with pytest.raises(RuntimeError, match="chunk 2 failed"):
+            streaming.run(
+                iter(range(5)),
+                [lambda item: _fail_on(2)(item) and rows],
+                lambda batches: script3.refresh_mysql_stream(batches, table="monthly_winners"),
+                maxsize=1,
+            )
+    assert any("monthly_winners__new" in sql for sql in statements)
+    assert not any("RENAME TABLE" in sql for sql in statements)
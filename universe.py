@@ -0,0 +1,143 @@
+import os
+import io
+import csv
+import json
+import datetime
+import logging
+
+import metrics
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+BASE_URL = "https://www.niftyindices.com/IndexConstituent/"
+INDEX_LISTS = {
+    "nifty50": "ind_nifty50list.csv",
+    "niftynext50": "ind_niftynext50list.csv",
+    "nifty100": "ind_nifty100list.csv",
+    "nifty200": "ind_nifty200list.csv",
+    "nifty500": "ind_nifty500list.csv",
+    "midcap150": "ind_niftymidcap150list.csv",
+    "smallcap250": "ind_niftysmallcap250list.csv",
+    "bank": "ind_niftybanklist.csv",
+    "it": "ind_niftyitlist.csv",
+    "pharma": "ind_niftypharmalist.csv",
+}
+
+CACHE_DIR = os.getenv("UNIVERSE_CACHE_DIR", os.path.join(".cache", "universe"))
+# Within the TTL the cached list is used without touching NSE at all
+TTL = datetime.timedelta(hours=float(os.getenv("UNIVERSE_TTL_HOURS", "24")))
+TIMEOUT = float(os.getenv("UNIVERSE_TIMEOUT_SECONDS", "10"))
+
+_session = None
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Pooled HTTP Session
+# ──────────────────────────────────────────────────────────────
+# requests is only imported once the cached list is stale
+def get_session():
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        _session = requests.Session()
+        _session.headers.update({"User-Agent": "Mozilla/5.0"})
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        _session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    return _session
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: Conditional GET with an On-disk Copy
+# ──────────────────────────────────────────────────────────────
+def _paths(index):
+    return (
+        os.path.join(CACHE_DIR, f"{index}.csv"),
+        os.path.join(CACHE_DIR, f"{index}.json"),
+    )
+
+
+def _read_cache(index):
+    csv_path, meta_path = _paths(index)
+    if not (os.path.exists(csv_path) and os.path.exists(meta_path)):
+        return None, {}
+    with open(csv_path, encoding="utf-8") as f:
+        text = f.read()
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    return text, meta
+
+
+def _write_cache(index, text, meta):
+    csv_path, meta_path = _paths(index)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if text is not None:
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def fetch_constituents_csv(index="nifty50"):
+    if index not in INDEX_LISTS:
+        raise ValueError(f"Unknown index list: {index}")
+
+    cached, meta = _read_cache(index)
+    now = datetime.datetime.now()
+    if cached is not None and now - datetime.datetime.fromisoformat(meta["fetched_at"]) < TTL:
+        logging.info(f"♻️ Using cached {index} list")
+        return cached
+
+    headers = {}
+    if cached is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    import requests
+    try:
+        response = get_session().get(BASE_URL + INDEX_LISTS[index], headers=headers, timeout=TIMEOUT)
+        if response.status_code == 304 and cached is not None:
+            logging.info(f"✅ {index} list unchanged since last fetch")
+            meta["fetched_at"] = now.isoformat()
+            _write_cache(index, None, meta)
+            return cached
+
+        response.raise_for_status()
+        metrics.add_bytes(len(response.content))
+        text = response.content.decode("utf-8-sig")
+        _write_cache(index, text, {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": now.isoformat(),
+        })
+        return text
+
+    except requests.RequestException as e:
+        if cached is None:
+            raise
+        logging.warning(f"⚠️ NSE unavailable ({e}); using cached {index} list from {meta['fetched_at']}")
+        return cached
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Parse the Constituent CSV
+# ──────────────────────────────────────────────────────────────
+def parse_symbols(text):
+    reader = csv.DictReader(io.StringIO(text))
+    symbols = []
+    for row in reader:
+        symbol = (row.get("Symbol") or "").strip()
+        if symbol:
+            symbols.append(symbol.replace("&", "and") + ".NS")
+    return symbols
+
+
+def get_symbols(index="nifty50", limit=None):
+    try:
+        symbols = parse_symbols(fetch_constituents_csv(index))
+    except Exception as e:
+        logging.error(f"❌ Failed to fetch {index} list: {e}")
+        return []
+    return symbols[:limit] if limit else symbols
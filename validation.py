@@ -0,0 +1,184 @@
+import os
+import re
+import datetime
+import logging
+
+import numpy as np
+import pandas as pd
+
+import columnar
+import db
+import schema
+
+# ──────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ──────────────────────────────────────────────────────────────
+DB_HOST = os.getenv("DB_HOST")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+
+ENABLED = os.getenv("VALIDATE", "1") != "0"
+TABLE = "quarantine_bars"
+COLUMNS = [
+    "ticker", "bar_interval", "date", "open", "high", "low", "close", "adj_close", "volume",
+    "reason", "detected_at",
+]
+
+# A close-to-close move beyond this many log points is treated as a bad print or an
+# unadjusted split (0.7 ~ +100% / -50%); a gap is more than this many calendar days between bars
+MAX_LOG_MOVE = {"1d": 0.4, "1wk": 0.6, "1mo": 1.0}
+MAX_GAP_DAYS = {"1d": 10, "1wk": 21, "1mo": 62}
+
+# ──────────────────────────────────────────────────────────────
+# STEP 1: Column Ranges From the Table Definitions
+# ──────────────────────────────────────────────────────────────
+# DECIMAL(p,s) holds |x| < 10 ** (p - s) once rounded to s places; anything larger fails the
+# whole INSERT. Returns (limit, s).
+def decimal_limit(table, column):
+    sql_type = dict(schema.table_spec(table)["columns"])[column]
+    match = re.match(r"DECIMAL\((\d+),\s*(\d+)\)", sql_type, re.IGNORECASE)
+    if not match:
+        return np.inf, 0
+    precision, scale = int(match.group(1)), int(match.group(2))
+    return 10.0 ** (precision - scale), scale
+
+
+def _rounds_out_of_range(values, table, column):
+    limit, scale = decimal_limit(table, column)
+    with np.errstate(invalid="ignore"):
+        return np.abs(np.round(values, scale)) >= limit
+
+# ──────────────────────────────────────────────────────────────
+# STEP 2: One Vectorized Pass Over the Long Frame
+# ──────────────────────────────────────────────────────────────
+# Returns one reason per bar ("" for clean bars). Checks run on whole columns; the
+# per-ticker checks sort the frame once by (ticker, date) and compare neighbours.
+def check_bars(long, interval, table="stock_data"):
+    prices = {field: long[field].to_numpy(dtype="float64", na_value=np.nan) for field in columnar.PRICE_FIELDS}
+    volume = long["Volume"].to_numpy(dtype="float64", na_value=np.nan)
+    o, h, l, c = prices["Open"], prices["High"], prices["Low"], prices["Close"]
+    reasons = np.full(len(long), "", dtype=object)
+
+    def flag(mask, reason):
+        reasons[mask & (reasons == "")] = reason
+
+    with np.errstate(invalid="ignore"):
+        flag(np.logical_or.reduce([p <= 0 for p in prices.values()]), "non_positive_price")
+        flag(volume < 0, "negative_volume")
+        flag(np.logical_or.reduce([
+            _rounds_out_of_range(prices[field], table, column)
+            for field, column in (("Open", "open"), ("High", "high"), ("Low", "low"),
+                                  ("Close", "close"), ("Adj Close", "adj_close"))
+        ]), "price_out_of_range")
+        # A tolerance of one paisa absorbs float32 rounding of the stored prices
+        flag((h < np.fmax(o, c) - 0.01) | (l > np.fmin(o, c) + 0.01) | (l > h + 0.01), "ohlc_inconsistent")
+
+    codes = long["ticker"].cat.codes.to_numpy()
+    dates = long.index.to_numpy()
+    order = np.lexsort((dates, codes))
+    same_ticker = np.zeros(len(long), dtype=bool)
+    same_ticker[1:] = codes[order][1:] == codes[order][:-1]
+
+    sorted_close = np.where(reasons[order] == "", c[order], np.nan)
+    previous = np.full(len(long), np.nan)
+    previous[1:] = sorted_close[:-1]
+    # Carry the last clean close forward within the ticker so one bad bar does not flag the next
+    previous = pd.Series(np.where(same_ticker, previous, np.nan)).groupby(codes[order]).ffill().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        moves = np.log(c[order] / previous)
+        jumps = np.abs(moves) > MAX_LOG_MOVE.get(interval, np.inf)
+    # The bar that moves straight back after a one-bar spike is not a spike itself
+    reverts = np.zeros(len(long), dtype=bool)
+    reverts[1:] = jumps[1:] & jumps[:-1] & same_ticker[1:] & (np.sign(moves[1:]) != np.sign(moves[:-1]))
+    spike = np.zeros(len(long), dtype=bool)
+    spike[order] = jumps & ~reverts
+    flag(spike, "outlier_return")
+
+    gaps = np.zeros(len(long), dtype=bool)
+    steps = np.diff(dates[order]) > np.timedelta64(MAX_GAP_DAYS.get(interval, 10 ** 6), "D")
+    gaps[order[1:]] = steps & same_ticker[1:]
+    return reasons, gaps
+
+
+def quarantine_rows(long, reasons, interval):
+    bad = reasons != ""
+    frame = long[bad]
+    detected_at = datetime.datetime.now()
+
+    def column(field):
+        values = frame[field].to_numpy(dtype="float64", na_value=np.nan)
+        return [None if np.isnan(v) else v for v in values.tolist()]
+
+    return list(zip(
+        [s.replace(".NS", "") for s in frame["ticker"].astype(str)],
+        [interval] * len(frame),
+        [d.date() for d in frame.index],
+        *[column(field) for field in columnar.FIELDS],
+        reasons[bad].tolist(),
+        [detected_at] * len(frame),
+    ))
+
+
+def validate(data, symbols, interval):
+    long = columnar.to_long(data, symbols)
+    reasons, gaps = check_bars(long, interval)
+    bad = reasons != ""
+    if gaps.any():
+        tickers = long["ticker"].to_numpy()[gaps]
+        logging.warning(
+            f"⚠️ {int(gaps.sum())} {interval} bars follow a gap of more than "
+            f"{MAX_GAP_DAYS.get(interval)} days ({', '.join(sorted(set(map(str, tickers)))[:5])} ...)"
+        )
+    if not bad.any():
+        return long, []
+
+    counts = pd.Series(reasons[bad]).value_counts()
+    logging.warning(
+        f"🚧 Quarantined {int(bad.sum())} of {len(long)} {interval} bars: "
+        + ", ".join(f"{reason} {count}" for reason, count in counts.items())
+    )
+    return long[~bad], quarantine_rows(long, reasons, interval)
+
+# ──────────────────────────────────────────────────────────────
+# STEP 3: Derived Values That Would Not Fit Their Column
+# ──────────────────────────────────────────────────────────────
+# A yearly return of 10,000,000% or more cannot be stored in DECIMAL(9,2); it is held back
+# (and quarantined under the company and 1 January of the year) instead of failing the batch
+def split_out_of_range(top_performers, table="yearly_top_performers", column="return_pct"):
+    values = np.array([r[3] for r in top_performers], dtype="float64")
+    bad = _rounds_out_of_range(values, table, column)
+    if not bad.any():
+        return top_performers, []
+
+    detected_at = datetime.datetime.now()
+    held = [r for r, b in zip(top_performers, bad) if b]
+    logging.warning(f"🚧 Held back {len(held)} {table} rows with {column} beyond ±{decimal_limit(table, column)[0]:g}")
+    return (
+        [r for r, b in zip(top_performers, bad) if not b],
+        [
+            (company, "1y", datetime.date(year, 1, 1), None, None, None, None, None, None,
+             f"{column}_out_of_range ({value})", detected_at)
+            for year, _, company, value in held
+        ],
+    )
+
+# ──────────────────────────────────────────────────────────────
+# STEP 4: Side Table
+# ──────────────────────────────────────────────────────────────
+# Always upserted: a bar that is still bad on the next run updates its row in place
+def store_quarantine(rows):
+    if not rows:
+        return True
+    try:
+        with db.session(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME) as conn:
+            cursor = conn.cursor()
+            schema.prepare_table(cursor, TABLE, mode="upsert")
+            db.write_rows(conn, TABLE, COLUMNS, rows, update_columns=schema.update_columns(TABLE))
+            conn.commit()
+            cursor.close()
+        logging.info(f"✅ {len(rows)} rows written to {TABLE}.")
+        return True
+    except Exception as e:
+        logging.error(f"❌ MySQL Error: {e}")
+        return False